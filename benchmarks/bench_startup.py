@@ -0,0 +1,81 @@
+"""
+Cold start 벤치마크
+
+- import: 새 파이썬 프로세스에서 모듈 import에 걸리는 시간 (중앙값)
+- advertise: 프로세스 시작부터 첫 BLE 광고가 시작될 때까지의 시간 (블루투스 어댑터 필요)
+
+    python benchmarks/bench_startup.py import -n 10
+    sudo -E python3 benchmarks/bench_startup.py advertise --no-uvloop
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import Tuple
+
+
+IMPORT_TARGETS = ['ble_wifi_connector.__main__', 'ble_wifi_connector.cli']
+
+IMPORT_SNIPPET = '''
+import time
+t = time.perf_counter()
+import {module}
+print(time.perf_counter() - t)
+'''
+
+ADVERTISE_SNIPPET = '''
+import time
+t = time.perf_counter()
+import asyncio
+from ble_wifi_connector.common.utils import install_uvloop
+from ble_wifi_connector.ble_advertiser import BLEAdvertiser
+
+async def run():
+    ble_advertiser = BLEAdvertiser()
+    await ble_advertiser.start()
+    while not await ble_advertiser.is_advertising():
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - t
+    await ble_advertiser.stop()
+    return elapsed
+
+install_uvloop({use_uvloop})
+print(asyncio.run(run()))
+'''
+
+
+def run_snippet(snippet: str) -> Tuple[float, float]:
+    # 인터프리터 기동 시간까지 포함하기 위해 매번 새 프로세스에서 측정한다.
+    start = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', snippet], text=True)
+    total = time.perf_counter() - start
+    return float(output.strip().splitlines()[-1]), total
+
+
+def bench_import(repeat: int):
+    for module in IMPORT_TARGETS:
+        results = [run_snippet(IMPORT_SNIPPET.format(module=module)) for _ in range(repeat)]
+        import_time = statistics.median(r[0] for r in results)
+        process_time = statistics.median(r[1] for r in results)
+        print(f'{module:<32} import: {import_time * 1000:8.1f} ms   process: {process_time * 1000:8.1f} ms')
+
+
+def bench_advertise(repeat: int, use_uvloop: bool):
+    results = [run_snippet(ADVERTISE_SNIPPET.format(use_uvloop=use_uvloop)) for _ in range(repeat)]
+    advertise_time = statistics.median(r[0] for r in results)
+    print(f'time to advertising (uvloop={use_uvloop}): {advertise_time * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('target', choices=['import', 'advertise'])
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    parser.add_argument('--no-uvloop', action='store_true')
+    args = parser.parse_args()
+
+    if args.target == 'import':
+        bench_import(args.repeat)
+    else:
+        bench_advertise(args.repeat, not args.no_uvloop)
@@ -0,0 +1,142 @@
+"""
+GATT 조각 전송 벤치마크 (ble_wifi_connector.chunked_transfer)
+
+- simulate: 메모리 안의 링크 모델로 프로토콜을 돌려서 MTU별 조각 수, 왕복 횟수, 예상 처리량을 비교한다.
+            window 방식과 조각마다 ACK를 기다리는 방식(stop-and-wait)을 같이 보여준다.
+- ble: 실행 중인 허브에 실제로 보내서 처리량과 왕복 횟수를 잰다. (블루투스 어댑터 필요)
+
+    python benchmarks/bench_transfer.py simulate --size 16384 --loss 0.01
+    python3 benchmarks/bench_transfer.py ble -n "JOI Hub XX:XX:XX:XX:XX:XX" --size 16384
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+
+from ble_wifi_connector.chunked_transfer import ChunkReceiver, TransferStatus, send_chunked
+
+
+SIMULATED_MTUS = [23, 185, 247, 517]
+
+
+class SimulatedClient:
+    """BleakClient 대신 ChunkReceiver에 바로 쓰는 가짜 링크
+
+    connection interval마다 packets_per_event개의 패킷이 나간다고 보고 시간을 계산한다.
+    응답이 필요한 쓰기와 ACK 대기는 connection interval 하나씩 걸린다고 본다.
+    """
+
+    def __init__(self, mtu: int, receiver: ChunkReceiver, interval: float, packets_per_event: int, loss: float) -> None:
+        self.mtu_size = mtu
+        self._receiver = receiver
+        self._interval = interval
+        self._packets_per_event = packets_per_event
+        self._loss = loss
+        self._callback = None
+        self.link_time = 0.0
+
+    async def start_notify(self, char, callback):
+        self._callback = callback
+
+    async def stop_notify(self, char):
+        self._callback = None
+
+    async def write_gatt_char(self, char, data: bytes, response: bool = False):
+        if response:
+            self.link_time += self._interval
+            ack = self._receiver.control(bytes(data), self.mtu_size)
+        else:
+            self.link_time += self._interval / self._packets_per_event
+            if random.random() < self._loss:
+                return
+            ack = self._receiver.receive(bytes(data))
+        if ack is not None:
+            self._callback(char, bytearray(ack))
+
+
+async def simulate_once(payload: bytes, mtu: int, window_bytes: int, args):
+    client = SimulatedClient(mtu, ChunkReceiver(window_bytes=window_bytes), args.interval / 1000, args.packets_per_event, args.loss)
+    stats = await send_chunked(client, 'control', 'data', payload, echo=lambda message: None, ack_timeout=0.05)
+    if stats.status != TransferStatus.DONE:
+        raise RuntimeError(f'transfer failed: {stats.status}')
+    # ACK는 다음 connection event에 온다.
+    modeled_time = client.link_time + stats.round_trips * args.interval / 1000
+    return stats, modeled_time
+
+
+def bench_simulate(args):
+    payload = os.urandom(args.size)
+    print(f'payload: {args.size} bytes, connection interval: {args.interval} ms, packets/event: {args.packets_per_event}, loss: {args.loss}')
+    print(f'{"mtu":>5} {"mode":<14} {"chunks":>7} {"window":>7} {"round trips":>12} {"retransmits":>12} {"KiB/s":>8}')
+    for mtu in SIMULATED_MTUS:
+        for mode, window_bytes in (('window', None), ('stop-and-wait', 1)):
+            results = [
+                asyncio.run(simulate_once(payload, mtu, window_bytes if window_bytes is not None else args.window_bytes, args))
+                for _ in range(args.repeat)
+            ]
+            stats = results[0][0]
+            round_trips = statistics.median(r[0].round_trips for r in results)
+            retransmits = statistics.median(r[0].retransmits for r in results)
+            modeled_time = statistics.median(r[1] for r in results)
+            print(
+                f'{mtu:>5} {mode:<14} {stats.chunks:>7} {stats.window:>7} {round_trips:>12.0f} {retransmits:>12.0f} '
+                f'{args.size / modeled_time / 1024:>8.1f}'
+            )
+
+
+async def ble_once(args, payload: bytes):
+    from bleak import BleakClient
+
+    from ble_wifi_connector.cli import ble_discover
+    from ble_wifi_connector.common.uuids import HubWifiUUID
+
+    if (discovered_device := await ble_discover(args.device_name)) is None:
+        raise RuntimeError(f'{args.device_name} not found')
+
+    async with BleakClient(discovered_device.address) as client:
+        control_char = client.services.get_characteristic(HubWifiUUID.TRANSFER_CONTROL.lower())
+        data_char = client.services.get_characteristic(HubWifiUUID.TRANSFER_DATA.lower())
+        if control_char is None or data_char is None:
+            raise RuntimeError('Hub does not support payload transfer')
+
+        results = []
+        for _ in range(args.repeat):
+            stats = await send_chunked(client, control_char, data_char, payload, echo=print)
+            if stats.status != TransferStatus.DONE:
+                raise RuntimeError(f'transfer failed: {stats.status}')
+            results.append(stats)
+        return results
+
+
+def bench_ble(args):
+    results = asyncio.run(ble_once(args, os.urandom(args.size)))
+    stats = results[0]
+    throughput = statistics.median(r.throughput for r in results)
+    round_trips = statistics.median(r.round_trips for r in results)
+    retransmits = statistics.median(r.retransmits for r in results)
+    print(
+        f'payload: {args.size} bytes, chunk: {stats.chunk_size} bytes, window: {stats.window}, '
+        f'round trips: {round_trips:.0f}, retransmits: {retransmits:.0f}, throughput: {throughput / 1024:.1f} KiB/s'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('target', choices=['simulate', 'ble'])
+    parser.add_argument('-n', '--device-name', type=str, help="hub name (only for 'ble')")
+    parser.add_argument('--size', type=int, default=16 * 1024)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--interval', type=float, default=30, help='connection interval (ms, simulate)')
+    parser.add_argument('--packets-per-event', type=int, default=4, help='packets per connection event (simulate)')
+    parser.add_argument('--loss', type=float, default=0.0, help='drop rate of write without response (simulate)')
+    parser.add_argument('--window-bytes', type=int, default=4096, help='window size in bytes (simulate)')
+    args = parser.parse_args()
+
+    if args.target == 'simulate':
+        bench_simulate(args)
+    else:
+        if not args.device_name:
+            parser.error("'ble' needs --device-name")
+        bench_ble(args)
@@ -1,60 +1,231 @@
 from ble_wifi_connector.common.utils import *
+from ble_wifi_connector.common.systemd import SystemdNotifier
 
+import os
+import time
+import signal
 import asyncio
-from enum import Enum, auto
+from dataclasses import asdict
+from enum import Enum
 
-from ble_wifi_connector.ble_advertiser import BLEAdvertiser, BLEErrorCode
-from ble_wifi_connector.wifi_manager import WiFiManager
+from ble_wifi_connector.ble_advertiser import BLEAdvertiser, BLEErrorCode, AdvertisingMode
+from ble_wifi_connector.middleware_config import get_middleware_config
+from ble_wifi_connector.broker_discovery import BrokerAnnouncer, DEFAULT_BROKER_PORT
+from ble_wifi_connector.wifi_manager import WiFiManager, Uplink, UplinkPolicy, UplinkType
+from ble_wifi_connector.relay_provisioner import RelayProvisioner
+from ble_wifi_connector.softap_provisioner import SoftAPProvisioner
 from termcolor import colored
 
 
 EVENT_LOOP_TIME_OUT = 0.01
 CONNECT_RETRY = 3
+BROKER_ANNOUNCE = get_env_flag('BLE_WIFI_CONNECTOR_BROKER_ANNOUNCE', True)
+BROKER_PORT = int(os.environ.get('BLE_WIFI_CONNECTOR_BROKER_PORT', DEFAULT_BROKER_PORT))
+UPLINK_POLICY = UplinkPolicy(os.environ.get('BLE_WIFI_CONNECTOR_UPLINK_POLICY', UplinkPolicy.WIRED.value).lower())
+UPLINK_TARGET = os.environ.get('BLE_WIFI_CONNECTOR_UPLINK_TARGET', '8.8.8.8')
+UPLINK_CHECK_INTERVAL = float(os.environ.get('BLE_WIFI_CONNECTOR_UPLINK_CHECK_INTERVAL', 5))
+CONNECTED_CHECK_INTERVAL = float(os.environ.get('BLE_WIFI_CONNECTOR_CONNECTED_CHECK_INTERVAL', 30))
+WATCHDOG_STALL_TIMEOUT = float(os.environ.get('BLE_WIFI_CONNECTOR_WATCHDOG_STALL_TIMEOUT', 180))
+ADV_FAST_INTERVAL = int(os.environ.get('BLE_WIFI_CONNECTOR_ADV_FAST_INTERVAL', 100))
+ADV_SLOW_INTERVAL = int(os.environ.get('BLE_WIFI_CONNECTOR_ADV_SLOW_INTERVAL', 2000))
+ADV_TX_POWER = int(os.environ['BLE_WIFI_CONNECTOR_ADV_TX_POWER']) if os.environ.get('BLE_WIFI_CONNECTOR_ADV_TX_POWER') else None
+ADV_CONNECTED_MODE = AdvertisingMode(os.environ.get('BLE_WIFI_CONNECTOR_ADV_CONNECTED_MODE', AdvertisingMode.SLOW.value).lower())
+ADV_BOOST_DURATION = float(os.environ.get('BLE_WIFI_CONNECTOR_ADV_BOOST_DURATION', 120))
+RELAY_PROVISIONING = get_env_flag('BLE_WIFI_CONNECTOR_RELAY_PROVISIONING', False)
+RELAY_ALLOW_LIST = [pattern.strip() for pattern in os.environ.get('BLE_WIFI_CONNECTOR_RELAY_ALLOW_LIST', '').split(',') if pattern.strip()]
+RELAY_WORKERS = int(os.environ.get('BLE_WIFI_CONNECTOR_RELAY_WORKERS', 2))
+RELAY_RETRY_INTERVAL = float(os.environ.get('BLE_WIFI_CONNECTOR_RELAY_RETRY_INTERVAL', 300))
+RELAY_LOG = os.environ.get('BLE_WIFI_CONNECTOR_RELAY_LOG') or None
+SOFTAP_AFTER = float(os.environ.get('BLE_WIFI_CONNECTOR_SOFTAP_AFTER', 0))
+SOFTAP_SSID = os.environ.get('BLE_WIFI_CONNECTOR_SOFTAP_SSID', '')
+SOFTAP_PASSWORD = os.environ.get('BLE_WIFI_CONNECTOR_SOFTAP_PASSWORD') or None
+SOFTAP_PORT = int(os.environ.get('BLE_WIFI_CONNECTOR_SOFTAP_PORT', 80))
 
 
 class BLEWiFiConnectorState(Enum):
-    RESET = auto()
-    BLE_ADVERTISE = auto()
-    NETWORK_SETUP = auto()
-    NETWORK_CONNECTED = auto()
-    NETWORK_LOST = auto()
-    NETWORK_RECONNECTED = auto()
-    SHUTDOWN = auto()
+    # 상태 characteristic의 state 바이트로 그대로 나가므로 값을 바꾸거나 재사용하지 않는다.
+    RESET = 1
+    BLE_ADVERTISE = 2
+    NETWORK_SETUP = 3
+    NETWORK_CONNECTED = 4
+    NETWORK_LOST = 5
+    NETWORK_RECONNECTED = 6
+    WIRED_CONNECTED = 7
+    SHUTDOWN = 8
 
 
 async def main_event_loop():
     connect_try = CONNECT_RETRY
     state = BLEWiFiConnectorState.RESET
-    ble_advertiser = BLEAdvertiser(server_name=f'JOI Hub {get_mac_address()}')
+    ble_advertiser = BLEAdvertiser(
+        server_name=f'JOI Hub {get_mac_address()}',
+        fast_interval=ADV_FAST_INTERVAL,
+        slow_interval=ADV_SLOW_INTERVAL,
+        tx_power=ADV_TX_POWER,
+    )
     wifi_manager = WiFiManager()
+    broker_announcer = BrokerAnnouncer(port=BROKER_PORT)
+    relay_provisioner = RelayProvisioner(
+        allow_list=RELAY_ALLOW_LIST,
+        max_workers=RELAY_WORKERS,
+        retry_interval=RELAY_RETRY_INTERVAL,
+        outcome_log_path=RELAY_LOG,
+    )
+    softap = SoftAPProvisioner(
+        wifi_manager,
+        on_credentials=ble_advertiser.submit_credentials,
+        ssid=SOFTAP_SSID or f'JOI Hub Setup {(get_mac_address() or "").replace(":", "")[-6:].upper()}',
+        password=SOFTAP_PASSWORD,
+        port=SOFTAP_PORT,
+        status_provider=lambda: asdict(ble_advertiser.status),
+    )
+    notifier = SystemdNotifier()
+    watchdog_task = asyncio.ensure_future(notifier.run_watchdog(stall_timeout=WATCHDOG_STALL_TIMEOUT))
     logger = Logger().get_logger()
 
+    # Hub ID는 메모리에서 제공하고, middleware.cfg가 바뀌면 characteristic 값을 바로 갱신한다.
+    ble_advertiser.watch_middleware_config(get_middleware_config())
+
+    # systemctl stop이 보내는 SIGTERM은 메인 태스크를 취소해서 SHUTDOWN 단계로 정리하고 끝낸다.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    # SIGUSR1 (버튼 데몬, `systemctl kill -s USR1 ble-wifi-connector` 등)로 빠른 광고를 요청한다.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, ble_advertiser.boost, ADV_BOOST_DURATION)
+    # SIGUSR2로 기다리는 시간과 관계없이 SoftAP 설정을 시작한다.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, softap.request)
+
+    # 릴레이 설정은 허용할 디바이스를 명시했을 때만 켠다.
+    relay_enabled = RELAY_PROVISIONING and bool(RELAY_ALLOW_LIST)
+    if RELAY_PROVISIONING and not relay_enabled:
+        logger.debug(colored(f'Relay provisioning disabled: BLE_WIFI_CONNECTOR_RELAY_ALLOW_LIST is empty', 'yellow'))
+
+    # 이전 실행이 비정상 종료되면서 남긴 AP 프로필을 지운다.
+    if await wifi_manager.stop_access_point():
+        logger.debug(colored(f'Removed SoftAP profile left by a previous run', 'yellow'))
+
     ssid = ''
     pw = ''
+    wifi_connected = False
+    waiting_since: float = None  # 네트워크 없이 BLE_ADVERTISE에 들어온 시각
+
+    async def enter_uplink_state(uplink: Uplink) -> BLEWiFiConnectorState:
+        nonlocal wifi_connected, waiting_since
+
+        logger.debug(colored(f'Uplink found: {uplink}', 'green'))
+        waiting_since = None
+        await softap.stop()
+        if uplink.type == UplinkType.WIFI:
+            wifi_connected = True
+            return BLEWiFiConnectorState.NETWORK_CONNECTED
+
+        if ble_advertiser.is_started():
+            await ble_advertiser.stop()
+        await relay_provisioner.stop()
+        return BLEWiFiConnectorState.WIRED_CONNECTED
+
+    async def is_wifi_connected() -> bool:
+        # AP를 띄운 동안에는 nmcli가 AP 자신을 활성 WiFi로 보여줄 수 있으므로 확인하지 않는다.
+        return not softap.is_running() and await wifi_manager.is_connected()
 
+    async def start_relay_provisioning():
+        relay_ssid, relay_pw = ssid, pw
+        if not relay_ssid or not relay_pw:
+            if relay_provisioner.is_running():
+                return
+            # 부팅할 때 이미 WiFi에 연결되어 있었으면 NetworkManager에 저장된 값을 쓴다.
+            relay_ssid = await wifi_manager.get_current_ssid()
+            relay_pw = await wifi_manager.get_saved_password()
+        if not relay_ssid or not relay_pw or (ip_address := get_ip_address()) is None:
+            logger.debug(colored(f'Relay provisioning skipped: WiFi credentials or IP address unknown', 'yellow'))
+            return
+
+        relay_provisioner.set_credentials(relay_ssid, relay_pw, f'{ip_address}:{BROKER_PORT}')
+        await relay_provisioner.start()
+
+    reported_state = None
     while True:
         try:
-            await asyncio.sleep(EVENT_LOOP_TIME_OUT * 100)
+            notifier.heartbeat()
+            if state != reported_state:
+                notifier.status(state.name)
+                ble_advertiser.update_status(state=state.value)
+                reported_state = state
+
+            # RESET에서는 기다릴 것이 없으므로 대기 없이 바로 업링크 확인과 광고 단계로 넘어간다.
+            if state != BLEWiFiConnectorState.RESET:
+                await asyncio.sleep(EVENT_LOOP_TIME_OUT * 100)
 
             if state == BLEWiFiConnectorState.RESET:
-                state = BLEWiFiConnectorState.BLE_ADVERTISE
+                if (uplink := await wifi_manager.find_uplink(UPLINK_POLICY, UPLINK_TARGET)) is not None:
+                    state = await enter_uplink_state(uplink)
+                elif await is_wifi_connected():
+                    # 재시작 후 NetworkManager가 저장된 WiFi에 다시 연결한 경우 (업링크 정책과 관계없이)
+                    wifi_connected = True
+                    state = BLEWiFiConnectorState.NETWORK_CONNECTED
+                else:
+                    state = BLEWiFiConnectorState.BLE_ADVERTISE
             elif state == BLEWiFiConnectorState.BLE_ADVERTISE:
                 # BLE Advertise
-                await ble_advertiser.start()
-                if not await ble_advertiser.is_advertising():
-                    logger.debug(colored(f'BLE Advertiser start failed...', 'red'))
-                    await ble_advertiser.stop()
-                    state = BLEWiFiConnectorState.RESET
-                    continue
+                # 설정을 기다리는 동안은 빠르게, 이미 연결되어 있으면 느리게(또는 멈춰서) 광고한다.
+                await ble_advertiser.set_advertising_mode(ADV_CONNECTED_MODE if wifi_connected else AdvertisingMode.FAST)
+                if not ble_advertiser.is_started():
+                    try:
+                        await ble_advertiser.start()
+                        advertising = ble_advertiser.advertising_mode == AdvertisingMode.PAUSED or await ble_advertiser.is_advertising()
+                    except Exception as e:
+                        # bluetoothd가 없거나 어댑터가 죽어 있으면 bless가 D-Bus 예외를 던진다.
+                        logger.debug(colored(f'BLE Advertiser start error: {e}', 'red'))
+                        advertising = False
+                    if not advertising:
+                        logger.debug(colored(f'BLE Advertiser start failed...', 'red'))
+                        try:
+                            await ble_advertiser.stop()
+                        except Exception as e:
+                            logger.debug(colored(f'BLE Advertiser stop error: {e}', 'red'))
+                        if not wifi_connected and not softap.is_running():
+                            # bluetoothd를 쓸 수 없어도 설정을 받을 수 있게 SOFTAP_AFTER와 관계없이 바로 SoftAP를 띄운다.
+                            # BLE는 다음 루프에서 다시 시작해 본다.
+                            softap.request()
+                    else:
+                        logger.debug(colored(f'Wait for WiFi credentials from BLE...', 'yellow'))
+                    # BLE 없이도 서비스는 떠 있어야 하므로 실패해도 READY=1을 보낸다. 보내지 않으면 systemd가
+                    # TimeoutStartSec 뒤에 죽이고 다시 띄우기를 반복한다.
+                    notifier.ready()
+
+                if wifi_connected:
+                    # AP는 STA 연결과 같은 무선 장치를 쓰므로 연결되어 있는 동안에는 띄우지 않는다.
+                    softap.clear_request()
+                else:
+                    waiting_since = waiting_since or time.monotonic()
+                    if not softap.is_running() and (softap.requested or 0 < SOFTAP_AFTER <= time.monotonic() - waiting_since):
+                        if await wifi_manager.is_connected():
+                            # 그 사이에 NetworkManager가 WiFi에 연결했으면 AP로 연결을 끊지 않는다.
+                            softap.clear_request()
+                            wifi_connected = True
+                            state = BLEWiFiConnectorState.NETWORK_CONNECTED
+                            continue
+                        if not await softap.start():
+                            waiting_since = time.monotonic()
 
                 # Save WiFi, Broker info
-                logger.debug(colored(f'Wait for WiFi credentials from BLE...', 'yellow'))
-                wifi_credential = await ble_advertiser.wait_until_wifi_credentials_set(timeout=None)
-                ssid = wifi_credential[0]
-                pw = wifi_credential[1]
+                # 자격 증명을 기다리는 동안에도 주기적으로 업링크 상태를 확인한다.
+                # 연결된 동안에는 nmcli 호출로 무선 구간과 전력을 쓰지 않도록 더 드물게 확인한다.
+                check_interval = CONNECTED_CHECK_INTERVAL if wifi_connected else UPLINK_CHECK_INTERVAL
+                wifi_credential = await ble_advertiser.wait_until_wifi_credentials_set(timeout=check_interval)
                 error = wifi_credential[2]
                 # await ble_advertiser.stop()
 
+                if error == BLEErrorCode.WIFI_CONNECT_TIMEOUT:
+                    if (uplink := await wifi_manager.find_uplink(UPLINK_POLICY, UPLINK_TARGET)) is not None:
+                        state = await enter_uplink_state(uplink)
+                    elif wifi_connected or await is_wifi_connected():
+                        wifi_connected = True
+                        state = BLEWiFiConnectorState.NETWORK_CONNECTED
+                    continue
+
+                # AP를 내려야 같은 무선 장치로 WiFi에 연결할 수 있다.
+                await softap.stop()
+                ssid = wifi_credential[0]
+                pw = wifi_credential[1]
                 if error != BLEErrorCode.NO_ERROR:
                     logger.debug(colored(f'Something getting wrong while BLE setup! error code: {error}', 'red'))
                     state = BLEWiFiConnectorState.RESET
@@ -65,8 +236,10 @@ async def main_event_loop():
                 wifi_manager.set_wifi_credential(ssid=ssid, password=pw)
                 # await wifi_manager.disconnect()
                 await wifi_manager.connect()
-                if wifi_manager.check_connection():
-                    logger.debug(colored(f'WiFi connection success. SSID: {wifi_manager.get_connected_wifi_ssid()}', 'green'))
+                if await wifi_manager.is_connected():
+                    logger.debug(colored(f'WiFi connection success. SSID: {await wifi_manager.get_current_ssid()}', 'green'))
+                    wifi_connected = True
+                    waiting_since = None
                     state = BLEWiFiConnectorState.NETWORK_CONNECTED
                 else:
                     if connect_try > 0:
@@ -75,22 +248,58 @@ async def main_event_loop():
                         state = BLEWiFiConnectorState.NETWORK_SETUP
                     else:
                         logger.debug(colored(f'WiFi connection failed... Go back to BLE setup.', 'red'))
+                        ble_advertiser.set_error_code(BLEErrorCode.FAIL)
                         connect_try = CONNECT_RETRY
                         state = BLEWiFiConnectorState.RESET
             elif state == BLEWiFiConnectorState.NETWORK_CONNECTED:
-                if not wifi_manager.check_connection():
+                waiting_since = None
+                if not await wifi_manager.is_connected():
                     logger.debug(colored(f'WiFi connection lost...', 'yellow'))
                     state = BLEWiFiConnectorState.NETWORK_LOST
                 else:
+                    link_status = await wifi_manager.get_link_status()
+                    ble_advertiser.update_status(ssid=link_status.ssid, ipv4=link_status.ipv4, rssi=link_status.rssi)
+                    if BROKER_ANNOUNCE:
+                        # 주소가 바뀐 경우에만 mDNS 레코드를 갱신한다.
+                        await broker_announcer.start(get_ip_address())
+                    if relay_enabled:
+                        # 허브가 아는 WiFi와 브로커 정보로 주변 스마트 디바이스를 설정한다.
+                        await start_relay_provisioning()
                     state = BLEWiFiConnectorState.BLE_ADVERTISE
+            elif state == BLEWiFiConnectorState.WIRED_CONNECTED:
+                # 유선 업링크가 살아있는 동안에는 광고하지 않고 감시만 한다.
+                uplink = await wifi_manager.find_uplink(UPLINK_POLICY, UPLINK_TARGET)
+                if uplink is None or uplink.type == UplinkType.WIFI:
+                    logger.debug(colored(f'Wired uplink lost... Resume BLE setup.', 'yellow'))
+                    ble_advertiser.update_status(ssid='', ipv4='', rssi=None)
+                    await broker_announcer.stop()
+                    state = BLEWiFiConnectorState.RESET
+                else:
+                    notifier.ready()
+                    ble_advertiser.update_status(ssid='', ipv4=get_ip_address() or '', rssi=None)
+                    if BROKER_ANNOUNCE:
+                        await broker_announcer.start(get_ip_address())
+                    await asyncio.sleep(UPLINK_CHECK_INTERVAL)
             elif state == BLEWiFiConnectorState.NETWORK_LOST:
+                wifi_connected = False
+                ble_advertiser.update_status(ssid='', ipv4='', rssi=None)
+                await broker_announcer.stop()
+                await relay_provisioner.stop()
+                await ble_advertiser.set_advertising_mode(AdvertisingMode.FAST)
                 if not ssid == '' and not pw == '':
                     state = BLEWiFiConnectorState.NETWORK_SETUP
                 else:
                     state = BLEWiFiConnectorState.RESET
             elif state == BLEWiFiConnectorState.SHUTDOWN:
-                if await ble_advertiser.is_advertising():
+                notifier.stopping()
+                watchdog_task.cancel()
+                if ble_advertiser.is_started():
                     await ble_advertiser.stop()
+                await broker_announcer.stop()
+                await relay_provisioner.stop()
+                await softap.stop()
+                get_middleware_config().stop_watching()
+                notifier.close()
 
                 return 0
         except asyncio.CancelledError:
@@ -101,5 +310,10 @@ async def main_event_loop():
             state = BLEWiFiConnectorState.SHUTDOWN
 
 
-if __name__ == "__main__":
+def main():
+    install_uvloop()
     asyncio.run(main_event_loop())
+
+
+if __name__ == "__main__":
+    main()
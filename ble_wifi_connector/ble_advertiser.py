@@ -1,18 +1,21 @@
-__all__ = ['BLEAdvertiser', 'BLEErrorCode']
+__all__ = ['BLEAdvertiser', 'BLEErrorCode', 'AdvertisingMode']
 
 
+import time
 import asyncio
-import sys, click
-from typing import Any, List, Tuple
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Tuple
 from enum import Enum
-from contextlib import asynccontextmanager
 
 from termcolor import colored
 from bless import BlessServer, BlessGATTCharacteristic, GATTCharacteristicProperties, GATTAttributePermissions
-from bleak import BleakClient, BleakScanner
 
 from .common.utils import *
-from .common.models import DiscoveredBleDevice
+from .common.uuids import HubWifiUUID, DeviceWifiUUID
+from .common.models import StatusSnapshot, ProvisioningSession
+from .common.bluez import install_request_options_hook, get_request_options, get_central_address, get_request_mtu
+from .middleware_config import MiddlewareConfig, get_middleware_config
+from .chunked_transfer import ChunkReceiver, TransferKind, TransferStatus
 
 
 class BLEErrorCode(Enum):
@@ -26,6 +29,25 @@ class BLEErrorCode(Enum):
     BROKER_NOT_SET = -7
 
 
+class AdvertisingMode(Enum):
+    FAST = 'fast'  # 설정을 기다리는 중: 빠르게 발견되도록 짧은 주기로 광고
+    SLOW = 'slow'  # 네트워크 연결됨: 긴 주기로 광고해서 WiFi와 공유하는 무선 구간을 비워둔다.
+    PAUSED = 'paused'  # 광고 중지 (GATT 서버와 이미 연결된 central은 유지)
+
+
+# bless(BlueZ)가 광고를 등록할 때 쓰는 기본값
+DEFAULT_ADVERTISING_INTERVAL = 100
+DEFAULT_TX_POWER = 20
+# BlueZ LEAdvertisement1가 받는 범위
+MIN_ADVERTISING_INTERVAL = 20
+MAX_ADVERTISING_INTERVAL = 10485
+MIN_TX_POWER = -127
+MAX_TX_POWER = 20
+
+SESSION_TIMEOUT = 300
+LOCAL_SESSION = 'local'  # central 주소를 알 수 없을 때 (BlueZ 외 backend) 모든 요청이 공유하는 세션
+
+
 class Characteristic:
     def __init__(self, uuid: str, properties: GATTCharacteristicProperties, permissions: GATTAttributePermissions, value: bytearray = None):
         self.uuid = uuid
@@ -41,12 +63,12 @@ class Service:
 
 
 class HubWifiService(Service):
-    UUID = '540F0000-0000-0000-0000-000000000000'
+    UUID = HubWifiUUID.SERVICE
 
     class SetWifiSSIDCharacteristic(Characteristic):
         def __init__(self):
             super().__init__(
-                uuid='540F0001-0000-0000-0000-000000000000',
+                uuid=HubWifiUUID.SET_WIFI_SSID,
                 properties=GATTCharacteristicProperties.write,
                 permissions=GATTAttributePermissions.writeable,
             )
@@ -54,7 +76,7 @@ class HubWifiService(Service):
     class SetWifiPWCharacteristic(Characteristic):
         def __init__(self):
             super().__init__(
-                uuid='540F0002-0000-0000-0000-000000000000',
+                uuid=HubWifiUUID.SET_WIFI_PW,
                 properties=GATTCharacteristicProperties.write,
                 permissions=GATTAttributePermissions.writeable,
             )
@@ -62,39 +84,55 @@ class HubWifiService(Service):
     class ConnectWifiCharacteristic(Characteristic):
         def __init__(self):
             super().__init__(
-                uuid='540F0003-0000-0000-0000-000000000000',
+                uuid=HubWifiUUID.CONNECT_WIFI,
                 properties=GATTCharacteristicProperties.write,
                 permissions=GATTAttributePermissions.writeable,
             )
 
     class HubIDCharacteristic(Characteristic):
-        def __init__(self):
+        def __init__(self, hub_id: str = None):
+            # 값은 캐시된 middleware.cfg에서 가져온다. (파일이 바뀌면 BLEAdvertiser.watch_middleware_config가 갱신)
             super().__init__(
-                uuid='540F0004-0000-0000-0000-000000000000',
+                uuid=HubWifiUUID.HUB_ID,
                 properties=GATTCharacteristicProperties.read,
                 permissions=GATTAttributePermissions.readable,
-                value=self.get_middleware_identifier('/usr/local/joi/middleware/middleware.cfg').encode(),
+                value=(hub_id or get_middleware_config().hub_id).encode(),
             )
 
-        def get_middleware_identifier(self, config_path) -> str:
-            try:
-                with open(config_path, 'r') as file:
-                    for line in file:
-                        stripped_line: str = line.split('//')[0].strip()
-                        if stripped_line.startswith('middleware_identifier'):
-                            return f'''{stripped_line.split('=')[1].strip().strip('"')} {get_mac_address().replace(':', '').upper()}'''
-                return f"DEFAULT {get_mac_address().replace(':', '').upper()}"
-            except FileNotFoundError:
-                return f"DEFAULT {get_mac_address().replace(':', '').upper()}"
-
     class ErrorCodeCharacteristic(Characteristic):
         def __init__(self):
             super().__init__(
-                uuid='540F0005-0000-0000-0000-000000000000',
+                uuid=HubWifiUUID.ERROR_CODE,
                 properties=GATTCharacteristicProperties.read,
                 permissions=GATTAttributePermissions.readable,
             )
 
+    class StatusCharacteristic(Characteristic):
+        # 상태, SSID, IPv4, RSSI, 마지막 에러 코드, 펌웨어 버전을 한 번에 읽는다. (형식: StatusSnapshot)
+        def __init__(self):
+            super().__init__(
+                uuid=HubWifiUUID.STATUS,
+                properties=GATTCharacteristicProperties.read,
+                permissions=GATTAttributePermissions.readable,
+            )
+
+    class TransferControlCharacteristic(Characteristic):
+        # 한 번의 write에 담을 수 없는 값의 전송 시작/중단 요청과 ACK (형식: chunked_transfer)
+        def __init__(self):
+            super().__init__(
+                uuid=HubWifiUUID.TRANSFER_CONTROL,
+                properties=GATTCharacteristicProperties.write | GATTCharacteristicProperties.read | GATTCharacteristicProperties.notify,
+                permissions=GATTAttributePermissions.writeable | GATTAttributePermissions.readable,
+            )
+
+    class TransferDataCharacteristic(Characteristic):
+        def __init__(self):
+            super().__init__(
+                uuid=HubWifiUUID.TRANSFER_DATA,
+                properties=GATTCharacteristicProperties.write | GATTCharacteristicProperties.write_without_response,
+                permissions=GATTAttributePermissions.writeable,
+            )
+
     def __init__(self):
         characteristics = [
             self.SetWifiSSIDCharacteristic(),
@@ -102,17 +140,20 @@ class HubWifiService(Service):
             self.ConnectWifiCharacteristic(),
             self.HubIDCharacteristic(),
             self.ErrorCodeCharacteristic(),
+            self.StatusCharacteristic(),
+            self.TransferControlCharacteristic(),
+            self.TransferDataCharacteristic(),
         ]
         super().__init__(HubWifiService.UUID, characteristics)
 
 
 class DeviceWifiService(Service):
-    UUID = '640F0000-0000-0000-0000-000000000000'
+    UUID = DeviceWifiUUID.SERVICE
 
     class SetWifiSSIDCharacteristic(Characteristic):
         def __init__(self):
             super().__init__(
-                uuid='640F0001-0000-0000-0000-000000000000',
+                uuid=DeviceWifiUUID.SET_WIFI_SSID,
                 properties=GATTCharacteristicProperties.write,
                 permissions=GATTAttributePermissions.writeable,
             )
@@ -120,7 +161,7 @@ class DeviceWifiService(Service):
     class SetWifiPWCharacteristic(Characteristic):
         def __init__(self):
             super().__init__(
-                uuid='640F0002-0000-0000-0000-000000000000',
+                uuid=DeviceWifiUUID.SET_WIFI_PW,
                 properties=GATTCharacteristicProperties.write,
                 permissions=GATTAttributePermissions.writeable,
             )
@@ -128,7 +169,7 @@ class DeviceWifiService(Service):
     class SetBrokerInfoCharacteristic(Characteristic):
         def __init__(self):
             super().__init__(
-                uuid='640F0003-0000-0000-0000-000000000000',
+                uuid=DeviceWifiUUID.SET_BROKER_INFO,
                 properties=GATTCharacteristicProperties.write,
                 permissions=GATTAttributePermissions.writeable,
             )
@@ -136,23 +177,24 @@ class DeviceWifiService(Service):
     class ConnectWifiCharacteristic(Characteristic):
         def __init__(self):
             super().__init__(
-                uuid='640F0004-0000-0000-0000-000000000000',
+                uuid=DeviceWifiUUID.CONNECT_WIFI,
                 properties=GATTCharacteristicProperties.write,
                 permissions=GATTAttributePermissions.writeable,
             )
 
     class ThingIDCharacteristic(Characteristic):
-        def __init__(self):
+        def __init__(self, thing_id: str = None):
             super().__init__(
-                uuid='640F0005-0000-0000-0000-000000000000',
+                uuid=DeviceWifiUUID.THING_ID,
                 properties=GATTCharacteristicProperties.read,
                 permissions=GATTAttributePermissions.readable,
+                value=thing_id.encode() if thing_id is not None else None,
             )
 
     class ErrorCodeCharacteristic(Characteristic):
         def __init__(self):
             super().__init__(
-                uuid='640F0006-0000-0000-0000-000000000000',
+                uuid=DeviceWifiUUID.ERROR_CODE,
                 properties=GATTCharacteristicProperties.read,
                 permissions=GATTAttributePermissions.readable,
             )
@@ -163,357 +205,459 @@ class DeviceWifiService(Service):
             self.SetWifiPWCharacteristic(),
             self.SetBrokerInfoCharacteristic(),
             self.ConnectWifiCharacteristic(),
-            # self.ThingIDCharacteristic(), # this characteristic should be added, after thing id is set
+            # ThingIDCharacteristic should be added with BLEAdvertiser.add_characteristic(), after thing id is set
             self.ErrorCodeCharacteristic(),
         ]
         super().__init__(DeviceWifiService.UUID, characteristics)
 
 
 class BLEAdvertiser:
-    def __init__(self, server_name: str = f'JOI Hub {get_mac_address()}') -> None:
-        self._server_name = server_name
+    def __init__(
+        self,
+        server_name: str = None,
+        services: List[Service] = None,
+        fast_interval: int = DEFAULT_ADVERTISING_INTERVAL,
+        slow_interval: int = 2000,
+        tx_power: int = None,
+    ) -> None:
+        """
+        services: 제공할 GATT 서비스 목록, None이면 HubWifiService
+        fast_interval, slow_interval: 광고 주기 (ms, 20 ~ 10485)
+        tx_power: 광고 송신 출력 (dBm, -127 ~ 20), None이면 BlueZ 기본값
+
+        광고 주기와 송신 출력은 bluetoothd가 experimental 모드(-E)로 실행되어야 적용된다.
+        """
+        self._server_name = server_name or f'JOI Hub {get_mac_address()}'
         self._server: BlessServer = None
-        self._trigger = asyncio.Event()
+        self._services: List[Service] = services if services is not None else [HubWifiService()]
+        self._started = False
+        self._gatt_lock = asyncio.Lock()
+        self._sessions: Dict[str, ProvisioningSession] = {}
+        self._pending_sessions: asyncio.Queue = asyncio.Queue()
+        self._active_session: ProvisioningSession = None
+        self._transfer_listeners: List[Callable[[str, TransferKind, bytes], None]] = []
+        self._transfer_data_uuid = HubWifiService.TransferDataCharacteristic().uuid
         self._logger = Logger().get_logger()
 
+        # 범위를 벗어난 값으로 광고를 등록하면 BlueZ가 거절하므로 미리 범위 안으로 맞춘다.
+        self._fast_interval = self._clamp('fast_interval', fast_interval, MIN_ADVERTISING_INTERVAL, MAX_ADVERTISING_INTERVAL)
+        self._slow_interval = self._clamp('slow_interval', slow_interval, MIN_ADVERTISING_INTERVAL, MAX_ADVERTISING_INTERVAL)
+        self._tx_power = self._clamp('tx_power', tx_power, MIN_TX_POWER, MAX_TX_POWER) if tx_power is not None else None
+        self._advertising_mode = AdvertisingMode.FAST
+        self._boost_until = 0.0
+        self._applied_interval: int = None
+        self._applied_tx_power: int = None
+        self._advertising_lock = asyncio.Lock()
+
+        self._status = StatusSnapshot(firmware_version=get_firmware_version())
+        self._status_value = self._status.pack()
+        self._status_uuid = HubWifiService.StatusCharacteristic().uuid
+
+    def _clamp(self, name: str, value: int, minimum: int, maximum: int) -> int:
+        clamped = max(minimum, min(maximum, value))
+        if clamped != value:
+            self._logger.debug(colored(f'{name} {value} is out of range ({minimum} ~ {maximum}), use {clamped}', 'yellow'))
+        return clamped
+
+    def _get_session(self) -> ProvisioningSession:
+        """요청을 보낸 central의 세션. 오래 쓰이지 않은 세션은 여기서 정리한다."""
+        options = get_request_options()
+        address = get_central_address(options) or LOCAL_SESSION
+        now = time.monotonic()
+
+        for other_address, other in list(self._sessions.items()):
+            if now - other.last_seen > SESSION_TIMEOUT and other is not self._active_session:
+                del self._sessions[other_address]
+
+        if (session := self._sessions.get(address)) is None:
+            session = self._sessions[address] = ProvisioningSession(address=address)
+            self._logger.debug(f'New provisioning session: {address}')
+        session.last_seen = now
+        if (mtu := get_request_mtu(options)) is not None:
+            session.mtu = mtu
+        return session
+
+    @property
+    def sessions(self) -> List[ProvisioningSession]:
+        return list(self._sessions.values())
+
+    @property
+    def active_session(self) -> ProvisioningSession:
+        """마지막으로 wait_until_wifi_credentials_set이 돌려준 자격 증명의 세션"""
+        return self._active_session
+
     def _read_request(self, characteristic: BlessGATTCharacteristic, **kwargs) -> bytearray:
+        uuid = characteristic.uuid.upper()
+        if uuid == self._status_uuid:
+            return bytearray(self._status_value)
+        elif uuid == HubWifiService.ErrorCodeCharacteristic().uuid:
+            # 에러 코드는 요청한 central의 세션 결과를 돌려준다.
+            return bytearray(self._get_session().error_code.to_bytes(2, 'little', signed=True))
+        elif uuid == HubWifiService.TransferControlCharacteristic().uuid:
+            transfer = self._get_session().transfer
+            return bytearray(transfer.last_ack if transfer is not None else b'')
+
         self._logger.debug(f'Reading {characteristic.value}')
         return characteristic.value
 
-    def _write_request(self, characteristic: BlessGATTCharacteristic, value: Any, **kwargs):
-        self._logger.debug(f'Write event - UUID: {characteristic.uuid.upper()}, Value: {characteristic.value}')
+    @property
+    def status(self) -> StatusSnapshot:
+        return self._status
+
+    def update_status(self, **fields):
+        """StatusSnapshot 필드를 갱신한다. 읽기 요청은 미리 직렬화해 둔 값으로 바로 응답한다."""
+        changed = False
+        for name, value in fields.items():
+            if getattr(self._status, name) != value:
+                setattr(self._status, name, value)
+                changed = True
+
+        if changed:
+            self._status_value = self._status.pack()
+
+    def add_transfer_listener(self, listener: Callable[[str, TransferKind, bytes], None]):
+        """조각내서 보낸 값을 모두 받으면 (central 주소, 종류, 값)으로 listener를 호출한다."""
+        self._transfer_listeners.append(listener)
+
+    def _handle_transfer(self, session: ProvisioningSession, uuid: str, value: bytes):
+        if session.transfer is None:
+            session.transfer = ChunkReceiver()
+
+        if uuid == self._transfer_data_uuid:
+            ack = session.transfer.receive(value)
+        else:
+            ack = session.transfer.control(value, session.mtu)
+        if ack is None:
+            return
 
+        self.update_characteristic_value(HubWifiService.TransferControlCharacteristic().uuid, ack)
+        if session.transfer.status != TransferStatus.DONE:
+            if session.transfer.status != TransferStatus.ACK:
+                self._logger.debug(colored(f'Transfer failed: {session.transfer.status.name} (central: {session.address})', 'red'))
+            return
+
+        kind, payload = session.transfer.kind, session.transfer.payload
+        session.payloads[kind.value] = payload
+        self._logger.debug(colored(f'Transfer done: {kind.name}, {len(payload)} bytes (central: {session.address})', 'green'))
+        for listener in self._transfer_listeners:
+            try:
+                listener(session.address, kind, payload)
+            except Exception as e:
+                self._logger.debug(colored(f'Error occurred while notifying transfer: {e}', 'red'))
+
+    def _write_request(self, characteristic: BlessGATTCharacteristic, value: Any, **kwargs):
+        uuid = characteristic.uuid.upper()
+        if uuid == HubWifiService.SetWifiPWCharacteristic().uuid:
+            # 비밀번호는 로그에 남기지 않는다.
+            self._logger.debug(f'Write event - UUID: {uuid}')
+        elif uuid != self._transfer_data_uuid:
+            # 조각마다 로그를 남기면 전송 속도가 떨어진다.
+            self._logger.debug(f'Write event - UUID: {uuid}, Value: {characteristic.value}')
+
+        session = None
         try:
-            uuid = characteristic.uuid.upper()
-            char = self._server.get_characteristic(uuid)
-            char.value = value or self._server.get_characteristic(uuid).value
-            if uuid == HubWifiService.SetWifiSSIDCharacteristic().uuid:
-                self._logger.debug(f'WiFi SSID set: {self._server.get_characteristic(uuid).value}')
+            # SSID와 비밀번호는 공유 characteristic 값이 아니라 central별 세션에 모은다.
+            session = self._get_session()
+            if uuid in (self._transfer_data_uuid, HubWifiService.TransferControlCharacteristic().uuid):
+                self._handle_transfer(session, uuid, bytes(value))
+            elif uuid == HubWifiService.SetWifiSSIDCharacteristic().uuid:
+                session.ssid = bytes(value).decode()
+                self._logger.debug(f'WiFi SSID set: {session.ssid} (central: {session.address})')
             elif uuid == HubWifiService.SetWifiPWCharacteristic().uuid:
-                self._logger.debug(f'WiFi PW set: {self._server.get_characteristic(uuid).value}')
+                session.password = bytes(value).decode()
+                self._logger.debug(f'WiFi PW set: {len(session.password)} chars (central: {session.address})')
             elif uuid == HubWifiService.ConnectWifiCharacteristic().uuid:
-                ssid = self._server.get_characteristic(HubWifiService.SetWifiSSIDCharacteristic().uuid).value
-                pw = self._server.get_characteristic(HubWifiService.SetWifiPWCharacteristic().uuid).value
-                if ssid is None or pw is None:
-                    self._logger.debug(f'WiFi credentials not set... ssid: {ssid}, pw: {pw}')
-                    self._server.update_value(
-                        HubWifiService.ErrorCodeCharacteristic().uuid, BLEErrorCode.WIFI_CREDENTIAL_NOT_SET.value.to_bytes(2, 'little')
-                    )
+                if not session.ssid or not session.password:
+                    self._logger.debug(f'WiFi credentials not set... ssid: {session.ssid}, pw: {"set" if session.password else "not set"} (central: {session.address})')
+                    self.set_error_code(BLEErrorCode.WIFI_CREDENTIAL_NOT_SET, session)
                     return
                 else:
-                    self._logger.debug(colored(f'wifi credentials is set! ssid: {ssid}, pw: {pw}', 'green'))
-                    self._trigger.set()
+                    self._logger.debug(colored(f'wifi credentials is set! ssid: {session.ssid} (central: {session.address})', 'green'))
+                    self.set_error_code(BLEErrorCode.NO_ERROR, session)
+                    # 적용되기 전에 같은 central이 값을 다시 써도 이번 요청의 자격 증명이 유지되도록 복사해서 넘긴다.
+                    self._pending_sessions.put_nowait(replace(session))
+            else:
+                char = self._server.get_characteristic(uuid)
+                char.value = value or char.value
         except Exception as e:
             self._logger.debug(colored(f'Error occurred while writing characteristic: {e}', 'red'))
-            self._server.update_value(HubWifiService.ErrorCodeCharacteristic().uuid, BLEErrorCode.FAIL.value.to_bytes(2, 'little'))
+            self.set_error_code(BLEErrorCode.FAIL, session)
+
+    def submit_credentials(self, address: str, ssid: str, password: str, payloads: Dict[int, bytes] = None):
+        """BLE가 아닌 경로(SoftAP 등)로 받은 자격 증명도 wait_until_wifi_credentials_set으로 같이 넘긴다."""
+        session = self._sessions[address] = ProvisioningSession(
+            address=address, ssid=ssid, password=password, last_seen=time.monotonic(), payloads=dict(payloads or {})
+        )
+        self._pending_sessions.put_nowait(replace(session))
+
+    def set_error_code(self, error_code: BLEErrorCode, session: ProvisioningSession = None):
+        """session이 없으면 현재 적용 중인 자격 증명을 보낸 central에게 결과를 남긴다."""
+        session = session or self._active_session
+        if session is not None and (live_session := self._sessions.get(session.address)) is not None:
+            live_session.error_code = error_code.value
+
+        self.update_characteristic_value(HubWifiService.ErrorCodeCharacteristic().uuid, error_code.value.to_bytes(2, 'little', signed=True))
+        self.update_status(last_error=error_code.value)
+
+    def _find_characteristic(self, uuid: str) -> Tuple[Service, Characteristic]:
+        for service in self._services:
+            for char in service.characteristics:
+                if char.uuid.upper() == uuid.upper():
+                    return service, char
+        return None, None
+
+    def _find_service(self, uuid: str) -> Service:
+        for service in self._services:
+            if service.uuid.upper() == uuid.upper():
+                return service
+        return None
 
     async def _add_service(self, service: Service):
         await self._server.add_new_service(service.uuid)
         for char in service.characteristics:
             await self._server.add_new_characteristic(service.uuid, char.uuid, char.properties, char.value, char.permissions)
 
+    async def _reregister_application(self):
+        # BlueZ는 GATT 앱을 등록할 때만 객체를 읽어가므로, 변경된 구조는 앱을 다시 등록해서 반영한다.
+        # 광고와 연결은 그대로 유지되고, BlueZ가 GATT DB 변경을 감지해 연결된 central에 Service Changed를 indicate한다.
+        app = self._server.app
+        await app.unregister(self._server.adapter)
+        await app.register(self._server.adapter)
+
+    def _unexport_characteristic(self, bless_service, bless_char):
+        # bless는 목록 길이로 D-Bus 경로를 만들기 때문에 BlueZ 쪽 목록에는 남겨두고 export만 해제한다.
+        self._server.app.bus.unexport(bless_char.gatt.path)
+        bless_service.characteristics.remove(bless_char)
+        # bless 0.3.0의 get_characteristic은 bleak 호환용 handle 사전(_characteristics)에서 찾는다.
+        # 제거한 값이 남으면 같은 UUID로 다시 추가한 characteristic 대신 찾히므로 목록에 맞춰 다시 만든다.
+        bless_service._characteristics = dict(enumerate(bless_service.characteristics))
+
+    async def add_service(self, service: Service):
+        """서비스를 추가한다. 서버가 실행 중이면 재시작 없이 바로 반영된다."""
+        async with self._gatt_lock:
+            if self._find_service(service.uuid) is not None:
+                raise ValueError(f'Service {service.uuid} already exists')
+
+            self._services.append(service)
+            if not self._started:
+                return
+
+            await self._add_service(service)
+            await self._reregister_application()
+            self._logger.debug(f'GATT service added: {service.uuid}')
+
+    async def remove_service(self, uuid: str):
+        async with self._gatt_lock:
+            if (service := self._find_service(uuid)) is None:
+                return
+            if service is self._services[0]:
+                # 첫 번째 서비스 UUID가 광고에 실리므로 제거할 수 없다.
+                raise ValueError(f'Primary service {uuid} cannot be removed')
+
+            self._services.remove(service)
+            if not self._started:
+                return
+
+            bless_service = self._server.get_service(uuid)
+            for bless_char in list(bless_service.characteristics):
+                self._unexport_characteristic(bless_service, bless_char)
+            self._server.app.bus.unexport(bless_service.gatt.path)
+            # 같은 UUID로 다시 추가될 때 bless가 제거된 서비스를 찾지 않도록 한다.
+            # bless 0.3.0 BlueZGattService의 내부 속성(_uuid)에 의존하므로 bless를 올릴 때 확인해야 한다.
+            bless_service.gatt._uuid = ''
+            del self._server.services[bless_service.uuid]
+            await self._reregister_application()
+            self._logger.debug(f'GATT service removed: {uuid}')
+
+    async def add_characteristic(self, service_uuid: str, characteristic: Characteristic):
+        async with self._gatt_lock:
+            if (service := self._find_service(service_uuid)) is None:
+                raise ValueError(f'Service {service_uuid} not found')
+            if self._find_characteristic(characteristic.uuid)[1] is not None:
+                raise ValueError(f'Characteristic {characteristic.uuid} already exists')
+
+            service.characteristics.append(characteristic)
+            if not self._started:
+                return
+
+            await self._server.add_new_characteristic(
+                service.uuid, characteristic.uuid, characteristic.properties, characteristic.value, characteristic.permissions
+            )
+            await self._reregister_application()
+            self._logger.debug(f'GATT characteristic added: {characteristic.uuid}')
+
+    async def remove_characteristic(self, uuid: str):
+        async with self._gatt_lock:
+            service, char = self._find_characteristic(uuid)
+            if char is None:
+                return
+
+            service.characteristics.remove(char)
+            if not self._started:
+                return
+
+            bless_service = self._server.get_service(service.uuid)
+            self._unexport_characteristic(bless_service, bless_service.get_characteristic(uuid))
+            await self._reregister_application()
+            self._logger.debug(f'GATT characteristic removed: {uuid}')
+
+    def update_characteristic_value(self, uuid: str, value: bytes) -> bool:
+        """값만 바뀌는 경우에는 앱을 다시 등록하지 않고 값을 갱신한다. (notify 속성이면 구독자에게 전달된다.)"""
+        service, char = self._find_characteristic(uuid)
+        if char is None:
+            return False
+
+        char.value = bytearray(value)
+        if not self._started:
+            return True
+
+        bless_char = self._server.get_service(service.uuid).get_characteristic(uuid)
+        bless_char.value = bytearray(value)
+        return self._server.update_value(service.uuid, uuid)
+
+    def watch_middleware_config(self, middleware_config: MiddlewareConfig = None):
+        """middleware.cfg가 바뀌면 HubIDCharacteristic 값을 바로 갱신한다."""
+        middleware_config = middleware_config or get_middleware_config()
+        uuid = HubWifiService.HubIDCharacteristic().uuid
+        middleware_config.add_listener(lambda hub_id: self.update_characteristic_value(uuid, hub_id.encode()))
+        middleware_config.start_watching()
+
     async def start(self):
         self._logger.debug('Starting BLE advertiser...')
-        self._trigger.clear()
+        self._sessions.clear()
+        self._active_session = None
+        install_request_options_hook()
         self._server = BlessServer(name=self._server_name)
         self._server.read_request_func = self._read_request
         self._server.write_request_func = self._write_request
 
-        await self._add_service(HubWifiService())
+        for service in self._services:
+            await self._add_service(service)
 
         await self._server.start()
+        self._started = True
+        self._applied_interval = DEFAULT_ADVERTISING_INTERVAL
+        self._applied_tx_power = DEFAULT_TX_POWER
         self._logger.debug(f'BLE Advertising started with name {self._server_name}...')
 
-    async def is_advertising(self) -> bool:
-        if self._server is None:
-            return False
-
-        return await self._server.is_advertising()
-
-    async def wait_until_wifi_credentials_set(self, timeout: float = 30) -> Tuple[str, str, str, BLEErrorCode]:
-
-        async def wrapper() -> Tuple[str, str, str, BLEErrorCode]:
-            await self._trigger.wait()
-            ssid = self._server.get_characteristic(HubWifiService.SetWifiSSIDCharacteristic().uuid).value.decode()
-            pw = self._server.get_characteristic(HubWifiService.SetWifiPWCharacteristic().uuid).value.decode()
-            error_code = BLEErrorCode(int.from_bytes(self._server.get_characteristic(HubWifiService.ErrorCodeCharacteristic().uuid).value, 'little'))
-            self._logger.debug(colored(f'wifi credentials is set finally! ssid: {ssid}, pw: {pw}, error: {error_code}', 'green'))
-            return (ssid, pw, error_code)
-
-        try:
-            ssid, pw, error_code = await asyncio.wait_for(wrapper(), timeout)
-            return (ssid, pw, error_code)
-        except asyncio.TimeoutError:
-            return ('', '', '', BLEErrorCode.WIFI_CONNECT_TIMEOUT)
-
-    async def stop(self):
-        await self._server.stop()
-        self._logger.debug('BLE Advertising stopped...')
-
-    async def is_connected(self):
-        return await self._server.is_connected()
+        await self._apply_advertising_mode()
 
+    def is_started(self) -> bool:
+        return self._started
 
-@click.command()
-@click.option(
-    '--mode',
-    '-m',
-    type=click.Choice(['run_hub', 'set_hub', 'set_smart_device'], case_sensitive=False),
-    required=True,
-    help="Mode to run: 'run_hub', 'set_hub', 'set_smart_device'.",
-)
-@click.option('--ssid', '-ssid', type=str, required=True, help="WiFi SSID.")
-@click.option('--pw', '-pw', type=str, required=True, help="WiFi password.")
-@click.option('--device-name', '-n', type=str, required=True, help="device name")
-@click.option('--broker-host', '-b', type=str, required=False, help="Broker host <IP:PORT> (only required for 'smart_device').")
-def main(mode: str, ssid: str, pw: str, broker_host: str, device_name: str):
-    asyncio.run(async_main(mode, ssid, pw, broker_host, device_name))
-
-
-@asynccontextmanager
-async def connect_to_device(discovered_device: 'DiscoveredBleDevice'):
-    while True:
-        try:
-            async with BleakClient(discovered_device.address) as client:
-                click.echo(f"Connected to {discovered_device}")
-                yield client
-                break
-        except Exception as e:
-            click.echo(f"Error connecting to {discovered_device}: {e}")
+    @property
+    def advertising_mode(self) -> AdvertisingMode:
+        if time.monotonic() < self._boost_until:
+            return AdvertisingMode.FAST
+        return self._advertising_mode
 
+    async def set_advertising_mode(self, mode: AdvertisingMode):
+        self._advertising_mode = mode
+        await self._apply_advertising_mode()
 
-async def async_main(mode: str, ssid: str, pw: str, broker_host: str, device_name: str):
-    """
-    CLI to run BLE Advertiser in hub or smart_device mode.
-    """
+    def boost(self, duration: float):
+        """버튼, 제어 명령 등 로컬 트리거: duration 동안 정책과 관계없이 빠르게 광고한다."""
+        self._boost_until = time.monotonic() + duration
+        self._logger.debug(colored(f'Fast advertising requested for {duration} seconds', 'yellow'))
+        if self._started:
+            asyncio.ensure_future(self._apply_advertising_mode())
 
-    if mode == 'run_hub':
-        if broker_host or device_name:
-            click.echo("Error: 'broker_host' and 'device_name' are not valid options for 'hub' mode.")
+    async def _apply_advertising_mode(self):
+        if not self._started:
             return
 
-        ble_advertiser = BLEAdvertiser(server_name=f'JOI Hub {get_mac_address()}')
-        await ble_advertiser.start()
-        click.echo(f"BLE Hub Advertiser started with SSID: {ssid}, PW: {pw}")
-
-        ssid, pw, error_code = await ble_advertiser.wait_until_wifi_credentials_set()
-        click.echo(f"WiFi credentials set: SSID: {ssid}, PW: {pw}, Error Code: {error_code}")
-
-        await ble_advertiser.stop()
-    elif mode == 'set_hub':
-        if device_name is None:
-            device_name = f'JOI Hub {get_mac_address()}'
-
-        await set_hub_bleak(device_name, ssid, pw)
-    elif mode == 'set_smart_device':
-        if not broker_host or not device_name:
-            click.echo("Error: 'broker_host' and 'device_name' are required options for 'smart_device' mode.")
-            sys.exit(1)
-
-        await set_smart_device_bleak(device_name, ssid, pw, broker_host)
-    else:
-        click.echo("Invalid mode. Use 'hub' or 'smart_device'.")
-
-
-async def set_hub_bleak(device_name: str, ssid: str, pw: str):
-    """bleak를 사용한 허브 설정 (기존 로직)"""
-    if (discovered_device := await ble_discover(device_name)) is None:
-        click.echo(f"Error: Device {device_name} not found.")
-        sys.exit(1)
-
-    ssid_characteristic_uuid = HubWifiService.SetWifiSSIDCharacteristic().uuid
-    pw_characteristic_uuid = HubWifiService.SetWifiPWCharacteristic().uuid
-    connect_wifi_characteristic_uuid = HubWifiService.ConnectWifiCharacteristic().uuid
-
-    ssid_value = ssid.encode()
-    pw_value = pw.encode()
-
-    async with connect_to_device(discovered_device) as client:
-        # Wait for the client to be fully connected
-        await asyncio.sleep(1)
-
-        # Get the Hub WiFi service and its characteristics
-        hub_service = None
-        for service in client.services:
-            if service.uuid.upper() == HubWifiService.UUID.upper():
-                hub_service = service
-                break
+        mode = self.advertising_mode
+        if mode == AdvertisingMode.FAST:
+            interval = self._fast_interval
+        elif mode == AdvertisingMode.SLOW:
+            interval = self._slow_interval
+        else:
+            interval = None
+        tx_power = self._tx_power if self._tx_power is not None else DEFAULT_TX_POWER
+
+        async with self._advertising_lock:
+            if interval == self._applied_interval and (interval is None or tx_power == self._applied_tx_power):
+                return
+
+            # 등록된 광고의 주기는 바꿀 수 없으므로 GATT 서버는 그대로 두고 광고만 다시 등록한다.
+            app = getattr(self._server, 'app', None)
+            if app is None:
+                self._logger.debug(f'Advertising mode {mode.value} is not supported on this backend')
+                return
 
-        if not hub_service:
-            click.echo(f"Error: Hub WiFi service not found")
-            return
-
-        # Find characteristics within the Hub WiFi service
-        ssid_char = None
-        pw_char = None
-        connect_char = None
-
-        for char in hub_service.characteristics:
-            if char.uuid.upper() == ssid_characteristic_uuid.upper():
-                ssid_char = char
-            elif char.uuid.upper() == pw_characteristic_uuid.upper():
-                pw_char = char
-            elif char.uuid.upper() == connect_wifi_characteristic_uuid.upper():
-                connect_char = char
-
-        if not all([ssid_char, pw_char, connect_char]):
-            click.echo(f"Error: Required characteristics not found")
-            return
-
-        # Write characteristics with retry logic
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                await client.write_gatt_char(ssid_char, ssid_value)
-                click.echo("WiFi SSID set")
-                break
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    click.echo(f"Error setting WiFi SSID after {max_retries} attempts: {e}")
-                    return
-                await asyncio.sleep(0.5)
-
-        for attempt in range(max_retries):
             try:
-                await client.write_gatt_char(pw_char, pw_value)
-                click.echo("WiFi password set")
-                break
+                adapter = self._server.adapter
+                if app.advertisements:
+                    await app.stop_advertising(adapter)
+                self._applied_interval = None
+
+                if interval is not None:
+                    await self._register_advertisement(interval, tx_power)
+                    self._applied_interval = interval
+                    self._applied_tx_power = tx_power
+                self._logger.debug(f'BLE advertising mode: {mode.value} (interval: {interval} ms, tx power: {tx_power} dBm)')
             except Exception as e:
-                if attempt == max_retries - 1:
-                    click.echo(f"Error setting WiFi password after {max_retries} attempts: {e}")
-                    return
-                await asyncio.sleep(0.5)
-
-        for attempt in range(max_retries):
-            try:
-                await client.write_gatt_char(connect_char, bytearray([0x00]))
-                click.echo("WiFi connection attempt")
-                break
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    click.echo(f"Error triggering WiFi connection after {max_retries} attempts: {e}")
-                    return
-                await asyncio.sleep(0.5)
-
+                self._logger.debug(colored(f'Error occurred while changing advertising mode: {e}', 'red'))
 
-async def set_smart_device_bleak(device_name: str, ssid: str, pw: str, broker_host: str):
-    """bleak를 사용한 스마트 디바이스 설정 (기존 로직)"""
-    if (discovered_device := await ble_discover(device_name)) is None:
-        click.echo(f"Error: Device {device_name} not found.")
-        sys.exit(1)
+    async def _register_advertisement(self, interval: int, tx_power: int):
+        from bless.backends.bluezdbus.dbus.advertisement import BlueZLEAdvertisement, Type
 
-    ssid_value = ssid.encode()
-    pw_value = pw.encode()
-    broker_host_value = broker_host.encode()
+        # bless 0.3.0의 BlueZGattApplication.start_advertising과 같지만 등록 전에 주기와 출력을 정한다.
+        app = self._server.app
+        adapter = self._server.adapter
+        await app.set_name(adapter, app.app_name)
 
-    async with connect_to_device(discovered_device) as client:
-        # Wait for the client to be fully connected
-        await asyncio.sleep(1)
+        advertisement = BlueZLEAdvertisement(Type.PERIPHERAL, len(app.advertisements) + 1, app)
+        advertisement._service_uuids.append(app.services[0].UUID)
+        advertisement._min_interval = interval
+        advertisement._max_interval = interval
+        advertisement._tx_power = tx_power
+        app.bus.export(advertisement.path, advertisement)
 
-        # Get the Device WiFi service and its characteristics
-        device_service = None
-        for service in client.services:
-            if service.uuid.upper() == DeviceWifiService.UUID.upper():
-                device_service = service
-                break
-
-        if not device_service:
-            click.echo(f"Error: Device WiFi service not found")
-            return
+        iface = adapter.get_interface('org.bluez.LEAdvertisingManager1')
+        try:
+            await iface.call_register_advertisement(advertisement.path, {})
+        except Exception:
+            # 등록되지 않은 광고가 목록에 남으면 이후 stop_advertising이 계속 실패한다.
+            app.bus.unexport(advertisement.path, advertisement)
+            raise
+        app.advertisements.append(advertisement)
 
-        # Find characteristics within the Device WiFi service
-        ssid_char = None
-        pw_char = None
-        broker_char = None
-        connect_char = None
-
-        ssid_uuid = DeviceWifiService.SetWifiSSIDCharacteristic().uuid
-        pw_uuid = DeviceWifiService.SetWifiPWCharacteristic().uuid
-        broker_uuid = DeviceWifiService.SetBrokerInfoCharacteristic().uuid
-        connect_uuid = DeviceWifiService.ConnectWifiCharacteristic().uuid
-
-        for char in device_service.characteristics:
-            if char.uuid.upper() == ssid_uuid.upper():
-                ssid_char = char
-            elif char.uuid.upper() == pw_uuid.upper():
-                pw_char = char
-            elif char.uuid.upper() == broker_uuid.upper():
-                broker_char = char
-            elif char.uuid.upper() == connect_uuid.upper():
-                connect_char = char
-
-        if not all([ssid_char, pw_char, broker_char]):
-            click.echo(f"Error: Required characteristics not found")
-            return
+    async def is_advertising(self) -> bool:
+        if self._server is None:
+            return False
 
-        # Write characteristics with retry logic
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                await client.write_gatt_char(ssid_char, ssid_value)
-                click.echo("WiFi SSID set")
-                break
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    click.echo(f"Error setting WiFi SSID after {max_retries} attempts: {e}")
-                    return
-                await asyncio.sleep(0.5)
+        return await self._server.is_advertising()
 
-        for attempt in range(max_retries):
-            try:
-                await client.write_gatt_char(pw_char, pw_value)
-                click.echo("WiFi password set")
-                break
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    click.echo(f"Error setting WiFi password after {max_retries} attempts: {e}")
-                    return
-                await asyncio.sleep(0.5)
+    async def wait_until_wifi_credentials_set(self, timeout: float = 30) -> Tuple[str, str, BLEErrorCode]:
 
-        for attempt in range(max_retries):
-            try:
-                await client.write_gatt_char(broker_char, broker_host_value)
-                click.echo("Broker info set")
-                break
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    click.echo(f"Error setting broker info after {max_retries} attempts: {e}")
-                    return
-                await asyncio.sleep(0.5)
-
-        if connect_char:
-            for attempt in range(max_retries):
-                try:
-                    await client.write_gatt_char(connect_char, bytearray([0x00]))
-                    click.echo("WiFi connection attempt")
-                    break
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        click.echo(f"Error triggering WiFi connection after {max_retries} attempts: {e}")
-                        return
-                    await asyncio.sleep(0.5)
-
-
-async def ble_discover(name: str, timeout: float = 30) -> DiscoveredBleDevice:
-    """BLE 디바이스 검색"""
-
-    async def discover_device():
-        while True:
-            devices = await BleakScanner.discover(timeout=1)
-            for device in devices:
-                if device.name == name:
-                    click.echo(f'Found BLE server! Name: {device.name}, Address: {device.address}')
-                    return DiscoveredBleDevice(name=device.name, address=device.address)
-                else:
-                    click.echo(f'{device.name} | {device.address}')
-            click.echo(f"Discovering device with name: {name}, retrying...")
+        async def wrapper() -> Tuple[str, str, BLEErrorCode]:
+            # 여러 central이 동시에 연결을 요청하면 요청한 순서대로 하나씩 돌려준다.
+            session: ProvisioningSession = await self._pending_sessions.get()
+            self._active_session = self._sessions.get(session.address, session)
+            error_code = BLEErrorCode(session.error_code)
+            self._logger.debug(
+                colored(f'wifi credentials is set finally! ssid: {session.ssid}, error: {error_code} (central: {session.address})', 'green')
+            )
+            return (session.ssid, session.password, error_code)
 
-    try:
-        return await asyncio.wait_for(discover_device(), timeout)
-    except asyncio.TimeoutError:
-        click.echo(f"Timeout: Could not find device {name} within {timeout} seconds")
-        return None
+        try:
+            ssid, pw, error_code = await asyncio.wait_for(wrapper(), timeout)
+            return (ssid, pw, error_code)
+        except asyncio.TimeoutError:
+            return ('', '', BLEErrorCode.WIFI_CONNECT_TIMEOUT)
 
+    async def stop(self):
+        self._started = False
+        app = getattr(self._server, 'app', None)
+        if app is not None and not app.advertisements:
+            # 광고가 멈춰 있으면 bless의 stop()이 광고 해제에서 실패하므로 GATT 앱만 내린다.
+            await app.unregister(self._server.adapter)
+            app.bus.unexport(app.path, app)
+        else:
+            await self._server.stop()
+        self._applied_interval = None
+        self._logger.debug('BLE Advertising stopped...')
 
-if __name__ == '__main__':
-    main()
+    async def is_connected(self):
+        return await self._server.is_connected()
@@ -0,0 +1,181 @@
+__all__ = ['BrokerAnnouncer', 'BrokerDiscovery', 'BROKER_SERVICE_TYPE', 'DEFAULT_BROKER_PORT']
+
+
+import asyncio
+import time
+from typing import Dict, Optional, Set
+
+from termcolor import colored
+
+from .common.utils import *
+from .common.models import BrokerRecord
+
+
+BROKER_SERVICE_TYPE = '_mqtt._tcp.local.'
+DEFAULT_BROKER_PORT = 1883
+
+
+class BrokerAnnouncer:
+    """허브의 MQTT 브로커를 mDNS 서비스로 광고한다."""
+
+    def __init__(self, port: int = DEFAULT_BROKER_PORT, name: str = None) -> None:
+        self._port = port
+        self._name = name or f'JOI Hub {get_mac_address()}'
+        self._address: str = None
+        self._zeroconf = None
+        self._info = None
+        self._logger = Logger().get_logger()
+
+    @property
+    def address(self) -> str:
+        return self._address
+
+    def is_announcing(self) -> bool:
+        return self._info is not None
+
+    def _build_service_info(self, address: str):
+        from zeroconf.asyncio import AsyncServiceInfo
+
+        hostname = self._name.replace(' ', '-').lower()
+        return AsyncServiceInfo(
+            BROKER_SERVICE_TYPE,
+            f'{self._name}.{BROKER_SERVICE_TYPE}',
+            port=self._port,
+            properties={'hub': get_mac_address() or ''},
+            server=f'{hostname}.local.',
+            parsed_addresses=[address],
+        )
+
+    async def start(self, address: str) -> bool:
+        if address is None:
+            self._logger.debug(colored('Broker announce skipped: no IPv4 address', 'yellow'))
+            return False
+        if self._info is not None and address == self._address:
+            return True
+
+        try:
+            from zeroconf.asyncio import AsyncZeroconf
+
+            if self._zeroconf is None:
+                self._zeroconf = AsyncZeroconf()
+
+            info = self._build_service_info(address)
+            if self._info is None:
+                await self._zeroconf.async_register_service(info)
+            else:
+                # 같은 이름을 유지한 채 주소만 갱신한다.
+                await self._zeroconf.async_update_service(info)
+            self._info = info
+            self._address = address
+            self._logger.debug(colored(f'Broker announced via mDNS: {address}:{self._port}', 'green'))
+            return True
+        except Exception as e:
+            self._logger.debug(colored(f'Broker announce failed: {e}', 'red'))
+            return False
+
+    async def stop(self):
+        if self._zeroconf is None:
+            return
+
+        try:
+            if self._info is not None:
+                await self._zeroconf.async_unregister_service(self._info)
+            await self._zeroconf.async_close()
+        except Exception as e:
+            self._logger.debug(colored(f'Broker announce stop failed: {e}', 'red'))
+        finally:
+            self._zeroconf = None
+            self._info = None
+            self._address = None
+            self._logger.debug('Broker announce stopped...')
+
+
+class BrokerDiscovery:
+    """mDNS로 브로커를 찾고, 레코드 TTL이 남아있는 동안 결과를 캐시한다."""
+
+    def __init__(self, service_type: str = BROKER_SERVICE_TYPE) -> None:
+        self._service_type = service_type
+        self._zeroconf = None
+        self._browser = None
+        self._records: Dict[str, BrokerRecord] = {}
+        self._names: Set[str] = set()  # 브라우저가 알고 있는 서비스 이름
+        self._found = asyncio.Event()
+        self._logger = Logger().get_logger()
+
+    def get_cached(self) -> Optional[BrokerRecord]:
+        now = time.monotonic()
+        for name, record in list(self._records.items()):
+            if record.is_expired(now):
+                del self._records[name]
+
+        if not self._records:
+            return None
+        return max(self._records.values(), key=lambda record: record.expires_at)
+
+    async def resolve(self, timeout: float = 5) -> Optional[BrokerRecord]:
+        if (record := self.get_cached()) is not None:
+            return record
+
+        if self._browser is None:
+            await self._start_browser()
+        else:
+            # 브라우저는 이미 아는 서비스에 대해 Added를 다시 보내지 않으므로 TTL이 지난 이름은 직접 다시 묻는다.
+            for name in self._names:
+                asyncio.ensure_future(self._resolve_service(self._service_type, name))
+        try:
+            await asyncio.wait_for(self._wait_for_record(), timeout)
+        except asyncio.TimeoutError:
+            self._logger.debug(colored(f'No broker found via mDNS within {timeout} seconds', 'yellow'))
+        return self.get_cached()
+
+    async def _wait_for_record(self):
+        while self.get_cached() is None:
+            self._found.clear()
+            await self._found.wait()
+
+    async def _start_browser(self):
+        if self._browser is not None:
+            return
+
+        from zeroconf.asyncio import AsyncZeroconf, AsyncServiceBrowser
+
+        self._zeroconf = AsyncZeroconf()
+        self._browser = AsyncServiceBrowser(self._zeroconf.zeroconf, self._service_type, handlers=[self._on_service_state_change])
+
+    def _on_service_state_change(self, zeroconf, service_type: str, name: str, state_change) -> None:
+        from zeroconf import ServiceStateChange
+
+        if state_change == ServiceStateChange.Removed:
+            # goodbye 패킷을 받으면 TTL과 관계없이 바로 캐시에서 뺀다.
+            self._records.pop(name, None)
+            self._names.discard(name)
+            return
+
+        self._names.add(name)
+        asyncio.ensure_future(self._resolve_service(service_type, name))
+
+    async def _resolve_service(self, service_type: str, name: str):
+        from zeroconf import DNSService, IPVersion, current_time_millis
+
+        info = await self._zeroconf.async_get_service_info(service_type, name, timeout=3000)
+        if info is None or not (addresses := info.parsed_addresses(IPVersion.V4Only)):
+            return
+
+        # 캐시 수명은 SRV 레코드의 남은 TTL을 따른다.
+        now_ms = current_time_millis()
+        srv_records = [record for record in self._zeroconf.zeroconf.cache.entries_with_name(name) if isinstance(record, DNSService)]
+        ttl = min((srv.get_remaining_ttl(now_ms) for srv in srv_records), default=info.host_ttl)
+
+        record = BrokerRecord(name=name, host=addresses[0], port=info.port, expires_at=time.monotonic() + ttl)
+        self._records[name] = record
+        self._logger.debug(colored(f'Broker discovered via mDNS: {record}', 'green'))
+        self._found.set()
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.async_cancel()
+            self._browser = None
+        if self._zeroconf is not None:
+            await self._zeroconf.async_close()
+            self._zeroconf = None
+        self._names.clear()
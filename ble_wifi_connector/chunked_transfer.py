@@ -0,0 +1,307 @@
+__all__ = ['ChunkReceiver', 'ChunkSender', 'TransferAck', 'TransferKind', 'TransferStatus', 'send_chunked']
+
+
+import time
+import zlib
+import random
+import struct
+import asyncio
+from enum import Enum
+from typing import Callable, List, Optional
+
+from .common.models import TransferStats
+
+
+# 한 번의 ATT write에 담을 수 없는 값을 여러 조각으로 나눠 보내는 프로토콜
+#
+# control characteristic (write, read, notify)
+#   central -> hub  START: op(u8) transfer_id(u16) kind(u8) length(u32) crc32(u32)
+#                   ABORT: op(u8) transfer_id(u16)
+#   hub -> central  ACK:   transfer_id(u16) status(i8) next_seq(u16) window(u8) chunk_size(u16) (notify)
+# data characteristic (write without response)
+#   central -> hub  seq(u16) + chunk
+#
+# central은 ACK를 받을 때마다 next_seq부터 window개의 조각을 응답 없이 연달아 쓰고 다음 ACK를 기다린다.
+# hub는 window개를 순서대로 받으면 ACK를 보내고, 조각이 빠지면 빠진 위치를 한 번만 알려준다. (go-back-N)
+# 이미 받은 window를 다시 받으면 재전송 한 번에 한 번씩 현재 위치를 다시 알려준다.
+# 모든 조각을 받으면 CRC를 확인해서 DONE 또는 CRC_ERROR로 끝낸다.
+
+OP_START = 1
+OP_ABORT = 2
+
+START = struct.Struct('<BHBII')
+ABORT = struct.Struct('<BH')
+ACK = struct.Struct('<HbHBH')
+DATA_HEADER = struct.Struct('<H')
+
+ATT_WRITE_HEADER = 3
+DEFAULT_MTU = 23
+MAX_TRANSFER_SIZE = 64 * 1024
+# 한 window에 보낼 바이트 수. MTU가 작으면 window가 커지고, 크면 작아진다.
+WINDOW_BYTES = 4096
+MAX_WINDOW = 32
+
+
+class TransferKind(Enum):
+    RAW = 0
+    BROKER_CONFIG = 1
+    WIFI_ENTERPRISE_CONFIG = 2
+    CA_CERTIFICATE = 3
+
+
+class TransferStatus(Enum):
+    ACK = 0
+    DONE = 1
+    CRC_ERROR = -1
+    TOO_LARGE = -2
+    ABORTED = -3
+    PROTOCOL_ERROR = -4
+
+
+class TransferAck:
+    def __init__(self, transfer_id: int, status: TransferStatus, next_seq: int, window: int, chunk_size: int) -> None:
+        self.transfer_id = transfer_id
+        self.status = status
+        self.next_seq = next_seq
+        self.window = window
+        self.chunk_size = chunk_size
+
+    def pack(self) -> bytes:
+        return ACK.pack(self.transfer_id, self.status.value, self.next_seq, self.window, self.chunk_size)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> 'TransferAck':
+        transfer_id, status, next_seq, window, chunk_size = ACK.unpack_from(data)
+        return cls(transfer_id, TransferStatus(status), next_seq, window, chunk_size)
+
+    def __repr__(self):
+        return f'TransferAck({self.transfer_id}, {self.status.name}, next_seq={self.next_seq}, window={self.window}, chunk_size={self.chunk_size})'
+
+
+def get_chunk_size(mtu: int) -> int:
+    return max(1, mtu - ATT_WRITE_HEADER - DATA_HEADER.size)
+
+
+def get_window(chunk_size: int, window_bytes: int = WINDOW_BYTES) -> int:
+    return max(1, min(MAX_WINDOW, window_bytes // chunk_size))
+
+
+class ChunkReceiver:
+    """hub 쪽 수신 상태. central 하나당 하나씩 만든다."""
+
+    def __init__(self, max_size: int = MAX_TRANSFER_SIZE, window_bytes: int = WINDOW_BYTES) -> None:
+        self._max_size = max_size
+        self._window_bytes = window_bytes
+        self._transfer_id = 0
+        self._kind = TransferKind.RAW
+        self._length = 0
+        self._crc = 0
+        self._buffer = bytearray()
+        self._next_seq = 0
+        self._window_start = 0
+        self._window = 1
+        self._chunk_size = 1
+        self._nacked_seq: int = None
+        self._duplicate_seq: int = None  # 이번 재전송에서 마지막으로 받은 중복 조각
+        self._status: TransferStatus = None
+        self._last_ack = b''
+
+    @property
+    def kind(self) -> TransferKind:
+        return self._kind
+
+    @property
+    def status(self) -> Optional[TransferStatus]:
+        return self._status
+
+    @property
+    def payload(self) -> Optional[bytes]:
+        return bytes(self._buffer) if self._status == TransferStatus.DONE else None
+
+    @property
+    def last_ack(self) -> bytes:
+        return self._last_ack
+
+    def _ack(self, status: TransferStatus) -> bytes:
+        self._status = status
+        self._window_start = self._next_seq
+        self._last_ack = TransferAck(self._transfer_id, status, self._next_seq, self._window, self._chunk_size).pack()
+        return self._last_ack
+
+    def control(self, data: bytes, mtu: int = DEFAULT_MTU) -> bytes:
+        """control characteristic에 쓴 값을 처리하고 보낼 ACK를 돌려준다."""
+        op = data[0] if data else None
+        if op == OP_ABORT and len(data) >= ABORT.size:
+            _, self._transfer_id = ABORT.unpack_from(data)
+            self._buffer = bytearray()
+            return self._ack(TransferStatus.ABORTED)
+        if op != OP_START or len(data) < START.size:
+            return self._ack(TransferStatus.PROTOCOL_ERROR)
+
+        _, self._transfer_id, kind, self._length, self._crc = START.unpack_from(data)
+        self._buffer = bytearray()
+        self._next_seq = 0
+        self._nacked_seq = None
+        self._duplicate_seq = None
+        self._chunk_size = get_chunk_size(mtu)
+        self._window = get_window(self._chunk_size, self._window_bytes)
+        try:
+            self._kind = TransferKind(kind)
+        except ValueError:
+            return self._ack(TransferStatus.PROTOCOL_ERROR)
+        if self._length > self._max_size:
+            return self._ack(TransferStatus.TOO_LARGE)
+        if self._length == 0:
+            return self._finish()
+        return self._ack(TransferStatus.ACK)
+
+    def receive(self, packet: bytes) -> Optional[bytes]:
+        """data characteristic에 쓴 조각을 처리한다. ACK를 보내야 할 때만 값을 돌려준다."""
+        if self._status != TransferStatus.ACK or len(packet) < DATA_HEADER.size:
+            return None
+
+        (seq,) = DATA_HEADER.unpack_from(packet)
+        if seq < self._next_seq:
+            # ACK가 늦거나 사라져서 central이 이미 받은 window를 다시 보내고 있다. 현재 위치를 한 번 더 알려준다.
+            # 재전송은 window 앞에서부터 다시 시작하므로, seq가 되돌아가면 새 재전송으로 보고 다시 알린다.
+            # 그래야 다시 알린 ACK마저 사라져도 다음 재전송에서 또 알릴 수 있다.
+            is_new_round = self._duplicate_seq is None or seq <= self._duplicate_seq
+            self._duplicate_seq = seq
+            return self._ack(TransferStatus.ACK) if is_new_round else None
+        if seq > self._next_seq:
+            # 조각이 빠졌다. 같은 위치는 한 번만 알려서 ACK가 쏟아지지 않게 한다.
+            if self._nacked_seq == self._next_seq:
+                return None
+            self._nacked_seq = self._next_seq
+            return self._ack(TransferStatus.ACK)
+
+        chunk = packet[DATA_HEADER.size :]
+        if len(self._buffer) + len(chunk) > self._length:
+            return self._ack(TransferStatus.PROTOCOL_ERROR)
+        self._buffer += chunk
+        self._next_seq += 1
+        self._duplicate_seq = None
+
+        if len(self._buffer) == self._length:
+            return self._finish()
+        if self._next_seq - self._window_start >= self._window:
+            return self._ack(TransferStatus.ACK)
+        return None
+
+    def _finish(self) -> bytes:
+        if zlib.crc32(self._buffer) != self._crc:
+            self._buffer = bytearray()
+            return self._ack(TransferStatus.CRC_ERROR)
+        return self._ack(TransferStatus.DONE)
+
+
+class ChunkSender:
+    """central 쪽 송신 상태"""
+
+    def __init__(self, payload: bytes, kind: TransferKind = TransferKind.RAW, transfer_id: int = None) -> None:
+        if len(payload) > MAX_TRANSFER_SIZE:
+            raise ValueError(f'Payload is too large: {len(payload)} > {MAX_TRANSFER_SIZE}')
+        self._payload = bytes(payload)
+        self._kind = kind
+        self._transfer_id = transfer_id if transfer_id is not None else random.randrange(1 << 16)
+        self._chunk_size = 1
+
+    @property
+    def transfer_id(self) -> int:
+        return self._transfer_id
+
+    def start_packet(self) -> bytes:
+        return START.pack(OP_START, self._transfer_id, self._kind.value, len(self._payload), zlib.crc32(self._payload))
+
+    def abort_packet(self) -> bytes:
+        return ABORT.pack(OP_ABORT, self._transfer_id)
+
+    def parse_ack(self, data: bytes) -> Optional[TransferAck]:
+        """다른 central의 전송에 대한 ACK(notify는 구독자 모두에게 간다)는 무시한다."""
+        if len(data) < ACK.size:
+            return None
+        ack = TransferAck.unpack(data)
+        return ack if ack.transfer_id == self._transfer_id else None
+
+    def set_chunk_size(self, chunk_size: int):
+        self._chunk_size = max(1, chunk_size)
+
+    def window_packets(self, next_seq: int, window: int) -> List[bytes]:
+        packets = []
+        for seq in range(next_seq, next_seq + window):
+            offset = seq * self._chunk_size
+            if offset >= len(self._payload):
+                break
+            packets.append(DATA_HEADER.pack(seq) + self._payload[offset : offset + self._chunk_size])
+        return packets
+
+
+async def send_chunked(
+    client,
+    control_char,
+    data_char,
+    payload: bytes,
+    kind: TransferKind = TransferKind.RAW,
+    echo: Callable[[str], None] = print,
+    ack_timeout: float = 2,
+    max_retries: int = 5,
+) -> TransferStats:
+    """BleakClient로 payload를 조각내서 보낸다. window 안에서는 응답 없는 쓰기를 쓴다."""
+    sender = ChunkSender(payload, kind)
+    acks: asyncio.Queue = asyncio.Queue()
+
+    def on_notify(_, data: bytearray):
+        if (ack := sender.parse_ack(bytes(data))) is not None:
+            acks.put_nowait(ack)
+
+    async def next_ack() -> TransferAck:
+        # 재전송 중에 쌓인 ACK가 있으면 가장 앞선 것만 쓴다.
+        ack = await asyncio.wait_for(acks.get(), ack_timeout)
+        while not acks.empty():
+            newer = acks.get_nowait()
+            if newer.status != TransferStatus.ACK or newer.next_seq >= ack.next_seq:
+                ack = newer
+        return ack
+
+    stats = TransferStats(size=len(payload))
+    start = time.perf_counter()
+    await client.start_notify(control_char, on_notify)
+    try:
+        await client.write_gatt_char(control_char, sender.start_packet(), response=True)
+        ack = await next_ack()
+        stats.round_trips += 1
+
+        # hub가 알려준 조각 크기와 이쪽에서 협상된 MTU 중 작은 쪽을 쓴다.
+        chunk_size = min(ack.chunk_size, get_chunk_size(getattr(client, 'mtu_size', DEFAULT_MTU)))
+        sender.set_chunk_size(chunk_size)
+        stats.chunk_size = chunk_size
+        stats.window = ack.window
+
+        retries = 0
+        while ack.status == TransferStatus.ACK:
+            packets = sender.window_packets(ack.next_seq, ack.window)
+            for packet in packets:
+                await client.write_gatt_char(data_char, packet, response=False)
+            stats.chunks += len(packets)
+
+            try:
+                ack = await next_ack()
+                stats.round_trips += 1
+                retries = 0
+            except asyncio.TimeoutError:
+                # 마지막 ACK 위치부터 window를 다시 보낸다.
+                retries += 1
+                stats.retransmits += 1
+                if retries > max_retries:
+                    await client.write_gatt_char(control_char, sender.abort_packet(), response=True)
+                    echo(f'Error: no acknowledgement after {max_retries} retries')
+                    stats.status = TransferStatus.ABORTED
+                    return stats
+
+        stats.status = ack.status
+        if ack.status != TransferStatus.DONE:
+            echo(f'Error: transfer failed ({ack.status.name})')
+        return stats
+    finally:
+        stats.elapsed = time.perf_counter() - start
+        await client.stop_notify(control_char)
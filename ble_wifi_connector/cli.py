@@ -0,0 +1,244 @@
+__all__ = ['main']
+
+
+import asyncio
+import sys, click
+from contextlib import asynccontextmanager
+
+from .common.utils import *
+from .common.models import DiscoveredBleDevice
+from .common.uuids import HubWifiUUID
+from .relay_provisioner import write_device_wifi_credentials
+from .chunked_transfer import TransferKind, TransferStatus, send_chunked
+
+
+@click.command()
+@click.option(
+    '--mode',
+    '-m',
+    type=click.Choice(['run_hub', 'set_hub', 'set_smart_device'], case_sensitive=False),
+    required=True,
+    help="Mode to run: 'run_hub', 'set_hub', 'set_smart_device'.",
+)
+@click.option('--ssid', '-ssid', type=str, required=True, help="WiFi SSID.")
+@click.option('--pw', '-pw', type=str, required=True, help="WiFi password.")
+@click.option('--device-name', '-n', type=str, required=True, help="device name")
+@click.option('--broker-host', '-b', type=str, required=False, help="Broker host <IP:PORT> (only for 'smart_device', discovered via mDNS if omitted).")
+@click.option('--payload-file', '-f', type=click.File('rb'), required=False, help="File sent to the hub before the WiFi credentials (only for 'set_hub'). The hub stores it but does not apply it yet.")
+@click.option(
+    '--payload-kind',
+    type=click.Choice([kind.name.lower() for kind in TransferKind], case_sensitive=False),
+    default=TransferKind.RAW.name.lower(),
+    help="Kind of the payload file.",
+)
+def main(mode: str, ssid: str, pw: str, broker_host: str, device_name: str, payload_file, payload_kind: str):
+    install_uvloop()
+    payload = payload_file.read() if payload_file else None
+    asyncio.run(async_main(mode, ssid, pw, broker_host, device_name, payload, TransferKind[payload_kind.upper()]))
+
+
+@asynccontextmanager
+async def connect_to_device(discovered_device: 'DiscoveredBleDevice'):
+    from bleak import BleakClient
+
+    while True:
+        try:
+            async with BleakClient(discovered_device.address) as client:
+                click.echo(f"Connected to {discovered_device}")
+                yield client
+                break
+        except Exception as e:
+            click.echo(f"Error connecting to {discovered_device}: {e}")
+
+
+async def async_main(
+    mode: str, ssid: str, pw: str, broker_host: str, device_name: str, payload: bytes = None, payload_kind: TransferKind = TransferKind.RAW
+):
+    """
+    CLI to run BLE Advertiser in hub or smart_device mode.
+    """
+
+    if mode == 'run_hub':
+        if broker_host or device_name:
+            click.echo("Error: 'broker_host' and 'device_name' are not valid options for 'hub' mode.")
+            return
+
+        from .ble_advertiser import BLEAdvertiser
+
+        ble_advertiser = BLEAdvertiser(server_name=f'JOI Hub {get_mac_address()}')
+        await ble_advertiser.start()
+        click.echo(f"BLE Hub Advertiser started with SSID: {ssid}, PW: {pw}")
+
+        ssid, pw, error_code = await ble_advertiser.wait_until_wifi_credentials_set()
+        click.echo(f"WiFi credentials set: SSID: {ssid}, PW: {pw}, Error Code: {error_code}")
+
+        await ble_advertiser.stop()
+    elif mode == 'set_hub':
+        if device_name is None:
+            device_name = f'JOI Hub {get_mac_address()}'
+
+        await set_hub_bleak(device_name, ssid, pw, payload, payload_kind)
+    elif mode == 'set_smart_device':
+        if not device_name:
+            click.echo("Error: 'device_name' is a required option for 'smart_device' mode.")
+            sys.exit(1)
+        if not broker_host:
+            if (broker_host := await discover_broker_host()) is None:
+                click.echo("Error: 'broker_host' is not given and no broker was found via mDNS.")
+                sys.exit(1)
+
+        await set_smart_device_bleak(device_name, ssid, pw, broker_host)
+    else:
+        click.echo("Invalid mode. Use 'hub' or 'smart_device'.")
+
+
+async def discover_broker_host(timeout: float = 5) -> str:
+    """mDNS로 허브가 광고한 브로커 주소 검색"""
+    from .broker_discovery import BrokerDiscovery
+
+    broker_discovery = BrokerDiscovery()
+    try:
+        if (record := await broker_discovery.resolve(timeout)) is None:
+            return None
+        click.echo(f'Found broker via mDNS! {record}')
+        return record.address
+    finally:
+        await broker_discovery.close()
+
+
+async def set_hub_bleak(device_name: str, ssid: str, pw: str, payload: bytes = None, payload_kind: TransferKind = TransferKind.RAW):
+    """bleak를 사용한 허브 설정 (기존 로직)"""
+    if (discovered_device := await ble_discover(device_name)) is None:
+        click.echo(f"Error: Device {device_name} not found.")
+        sys.exit(1)
+
+    ssid_characteristic_uuid = HubWifiUUID.SET_WIFI_SSID
+    pw_characteristic_uuid = HubWifiUUID.SET_WIFI_PW
+    connect_wifi_characteristic_uuid = HubWifiUUID.CONNECT_WIFI
+    transfer_control_characteristic_uuid = HubWifiUUID.TRANSFER_CONTROL
+    transfer_data_characteristic_uuid = HubWifiUUID.TRANSFER_DATA
+
+    ssid_value = ssid.encode()
+    pw_value = pw.encode()
+
+    async with connect_to_device(discovered_device) as client:
+        # Wait for the client to be fully connected
+        await asyncio.sleep(1)
+
+        # Get the Hub WiFi service and its characteristics
+        hub_service = None
+        for service in client.services:
+            if service.uuid.upper() == HubWifiUUID.SERVICE.upper():
+                hub_service = service
+                break
+
+        if not hub_service:
+            click.echo(f"Error: Hub WiFi service not found")
+            return
+
+        # Find characteristics within the Hub WiFi service
+        ssid_char = None
+        pw_char = None
+        connect_char = None
+        transfer_control_char = None
+        transfer_data_char = None
+
+        for char in hub_service.characteristics:
+            if char.uuid.upper() == ssid_characteristic_uuid.upper():
+                ssid_char = char
+            elif char.uuid.upper() == pw_characteristic_uuid.upper():
+                pw_char = char
+            elif char.uuid.upper() == connect_wifi_characteristic_uuid.upper():
+                connect_char = char
+            elif char.uuid.upper() == transfer_control_characteristic_uuid.upper():
+                transfer_control_char = char
+            elif char.uuid.upper() == transfer_data_characteristic_uuid.upper():
+                transfer_data_char = char
+
+        if not all([ssid_char, pw_char, connect_char]):
+            click.echo(f"Error: Required characteristics not found")
+            return
+
+        if payload is not None:
+            if not all([transfer_control_char, transfer_data_char]):
+                click.echo(f"Error: Hub does not support payload transfer")
+                return
+
+            stats = await send_chunked(client, transfer_control_char, transfer_data_char, payload, payload_kind, echo=click.echo)
+            if stats.status != TransferStatus.DONE:
+                return
+            click.echo(
+                f"Payload sent: {stats.size} bytes in {stats.elapsed:.2f} s ({stats.throughput / 1024:.1f} KiB/s, "
+                f"{stats.round_trips} round trips, {stats.retransmits} retransmits)"
+            )
+
+        # Write characteristics with retry logic
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                await client.write_gatt_char(ssid_char, ssid_value)
+                click.echo("WiFi SSID set")
+                break
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    click.echo(f"Error setting WiFi SSID after {max_retries} attempts: {e}")
+                    return
+                await asyncio.sleep(0.5)
+
+        for attempt in range(max_retries):
+            try:
+                await client.write_gatt_char(pw_char, pw_value)
+                click.echo("WiFi password set")
+                break
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    click.echo(f"Error setting WiFi password after {max_retries} attempts: {e}")
+                    return
+                await asyncio.sleep(0.5)
+
+        for attempt in range(max_retries):
+            try:
+                await client.write_gatt_char(connect_char, bytearray([0x00]))
+                click.echo("WiFi connection attempt")
+                break
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    click.echo(f"Error triggering WiFi connection after {max_retries} attempts: {e}")
+                    return
+                await asyncio.sleep(0.5)
+
+
+async def set_smart_device_bleak(device_name: str, ssid: str, pw: str, broker_host: str):
+    """bleak를 사용한 스마트 디바이스 설정 (기존 로직)"""
+    if (discovered_device := await ble_discover(device_name)) is None:
+        click.echo(f"Error: Device {device_name} not found.")
+        sys.exit(1)
+
+    async with connect_to_device(discovered_device) as client:
+        await write_device_wifi_credentials(client, ssid, pw, broker_host, echo=click.echo)
+
+
+async def ble_discover(name: str, timeout: float = 30) -> DiscoveredBleDevice:
+    """BLE 디바이스 검색"""
+    from bleak import BleakScanner
+
+    async def discover_device():
+        while True:
+            devices = await BleakScanner.discover(timeout=1)
+            for device in devices:
+                if device.name == name:
+                    click.echo(f'Found BLE server! Name: {device.name}, Address: {device.address}')
+                    return DiscoveredBleDevice(name=device.name, address=device.address)
+                else:
+                    click.echo(f'{device.name} | {device.address}')
+            click.echo(f"Discovering device with name: {name}, retrying...")
+
+    try:
+        return await asyncio.wait_for(discover_device(), timeout)
+    except asyncio.TimeoutError:
+        click.echo(f"Timeout: Could not find device {name} within {timeout} seconds")
+        return None
+
+
+if __name__ == '__main__':
+    main()
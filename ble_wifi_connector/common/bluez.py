@@ -0,0 +1,63 @@
+__all__ = ['install_request_options_hook', 'get_request_options', 'get_central_address', 'get_request_mtu']
+
+
+import re
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+
+# bless는 BlueZ가 ReadValue/WriteValue에 넘겨주는 options(device, mtu 등)를 버리므로,
+# 요청을 처리하는 동안 options를 여기에 담아 read/write 콜백에서 꺼내 쓸 수 있게 한다.
+_request_options: ContextVar[Dict[str, Any]] = ContextVar('request_options', default={})
+_hook_installed = False
+
+
+def _wrap_method(method, options_index: int):
+    fn = method.fn
+
+    def wrapper(interface, *args):
+        token = _request_options.set(args[options_index] or {})
+        try:
+            return fn(interface, *args)
+        finally:
+            _request_options.reset(token)
+
+    method.fn = wrapper
+
+
+def install_request_options_hook() -> bool:
+    """BlueZ backend일 때만 설치된다. 여러 번 호출해도 한 번만 적용된다."""
+    global _hook_installed
+    if _hook_installed:
+        return True
+
+    try:
+        from bless.backends.bluezdbus.dbus.characteristic import BlueZGattCharacteristic
+    except ImportError:
+        return False
+
+    # dbus_next는 메서드 객체(_Method)를 클래스에 한 번만 만들어 두고 fn을 호출한다.
+    _wrap_method(BlueZGattCharacteristic.ReadValue.__dict__['__DBUS_METHOD'], 0)
+    _wrap_method(BlueZGattCharacteristic.WriteValue.__dict__['__DBUS_METHOD'], 1)
+    _hook_installed = True
+    return True
+
+
+def _unwrap(value: Any) -> Any:
+    return getattr(value, 'value', value)
+
+
+def get_request_options() -> Dict[str, Any]:
+    return {key: _unwrap(value) for key, value in _request_options.get().items()}
+
+
+def get_central_address(options: Dict[str, Any] = None) -> Optional[str]:
+    """요청을 보낸 central의 주소 (예: /org/bluez/hci0/dev_AA_BB_CC_DD_EE_FF -> AA:BB:CC:DD:EE:FF)"""
+    options = options if options is not None else get_request_options()
+    match = re.search(r'dev_([0-9A-Fa-f_]{17})$', options.get('device', ''))
+    return match.group(1).replace('_', ':').upper() if match else None
+
+
+def get_request_mtu(options: Dict[str, Any] = None) -> Optional[int]:
+    options = options if options is not None else get_request_options()
+    return options.get('mtu')
@@ -1,4 +1,7 @@
-from dataclasses import dataclass
+import struct
+import socket
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Dict, Optional
 
 
 @dataclass
@@ -10,4 +13,125 @@ class DiscoveredBleDevice:
         return f'{self.name} | {self.address}'
 
     def __repr__(self):
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
+
+
+@dataclass
+class BrokerRecord:
+    name: str
+    host: str
+    port: int
+    expires_at: float
+
+    @property
+    def address(self) -> str:
+        return f'{self.host}:{self.port}'
+
+    def is_expired(self, now: float) -> bool:
+        return now >= self.expires_at
+
+    def __str__(self):
+        return f'{self.name} | {self.address}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+@dataclass
+class StatusSnapshot:
+    """StatusCharacteristic 값
+
+    little endian, version 1:
+        u8 version | u8 state | i8 rssi (dBm, -128: unknown) | i16 last error code | 4B IPv4
+        | u8 len + SSID (utf-8) | u8 len + firmware version (utf-8)
+    """
+
+    VERSION: ClassVar[int] = 1
+    HEADER: ClassVar[struct.Struct] = struct.Struct('<BBbh4s')
+    RSSI_UNKNOWN: ClassVar[int] = -128
+
+    state: int = 0
+    ssid: str = ''
+    ipv4: str = ''
+    rssi: Optional[int] = None
+    last_error: int = 0
+    firmware_version: str = ''
+
+    def pack(self) -> bytes:
+        rssi = self.RSSI_UNKNOWN if self.rssi is None else max(self.RSSI_UNKNOWN, min(127, self.rssi))
+        ipv4 = socket.inet_aton(self.ipv4) if self.ipv4 else bytes(4)
+        ssid = self._encode(self.ssid)
+        firmware_version = self._encode(self.firmware_version)
+        header = self.HEADER.pack(self.VERSION, self.state, rssi, self.last_error, ipv4)
+        return header + bytes([len(ssid)]) + ssid + bytes([len(firmware_version)]) + firmware_version
+
+    @staticmethod
+    def _encode(text: str, limit: int = 255) -> bytes:
+        # 길이가 u8이므로 잘라야 하지만, 멀티바이트 문자 중간에서 자르면 unpack()에서 디코딩할 수 없다.
+        return text.encode()[:limit].decode(errors='ignore').encode()
+
+    @classmethod
+    def unpack(cls, data: bytes) -> 'StatusSnapshot':
+        version, state, rssi, last_error, ipv4 = cls.HEADER.unpack_from(data)
+        if version != cls.VERSION:
+            raise ValueError(f'Unsupported status snapshot version: {version}')
+
+        offset = cls.HEADER.size
+        ssid = data[offset + 1 : offset + 1 + data[offset]].decode()
+        offset += 1 + data[offset]
+        firmware_version = data[offset + 1 : offset + 1 + data[offset]].decode()
+        return cls(
+            state=state,
+            ssid=ssid,
+            ipv4=socket.inet_ntoa(ipv4) if any(ipv4) else '',
+            rssi=None if rssi == cls.RSSI_UNKNOWN else rssi,
+            last_error=last_error,
+            firmware_version=firmware_version,
+        )
+
+
+@dataclass
+class ProvisioningSession:
+    """BLE로 연결된 central 하나의 설정 상태"""
+
+    address: str
+    ssid: str = ''
+    password: str = ''
+    error_code: int = 0
+    mtu: int = 23
+    last_seen: float = 0.0
+    transfer: Any = None  # chunked_transfer.ChunkReceiver, 첫 전송 요청 때 만든다.
+    payloads: Dict[int, bytes] = field(default_factory=dict)  # TransferKind 값 -> 받은 값
+
+
+@dataclass
+class RelayOutcome:
+    """허브가 대신 설정한 스마트 디바이스 하나의 결과"""
+
+    address: str
+    name: str
+    success: bool
+    message: str = ''
+    finished_at: float = 0.0
+
+    def __str__(self):
+        return f'{self.name} ({self.address}): {"success" if self.success else "failed"} {self.message}'.rstrip()
+
+
+@dataclass
+class TransferStats:
+    """chunked_transfer.send_chunked 한 번의 결과"""
+
+    size: int
+    chunk_size: int = 0
+    window: int = 0
+    chunks: int = 0
+    round_trips: int = 0
+    retransmits: int = 0
+    elapsed: float = 0.0
+    status: Any = None  # chunked_transfer.TransferStatus
+
+    @property
+    def throughput(self) -> float:
+        """bytes/s"""
+        return self.size / self.elapsed if self.elapsed > 0 else 0.0
@@ -0,0 +1,95 @@
+__all__ = ['SystemdNotifier']
+
+
+import os
+import time
+import socket
+import asyncio
+
+from .utils import Logger
+
+
+class SystemdNotifier:
+    """sd_notify 프로토콜 구현 (libsystemd 없이 NOTIFY_SOCKET으로 직접 보낸다)
+
+    systemd 밖에서 실행되면 NOTIFY_SOCKET이 없으므로 모든 호출이 아무 일도 하지 않는다.
+    """
+
+    def __init__(self) -> None:
+        self._address = os.environ.get('NOTIFY_SOCKET')
+        if self._address and self._address.startswith('@'):
+            # abstract namespace 소켓
+            self._address = '\0' + self._address[1:]
+
+        self._watchdog_interval: float = None
+        watchdog_usec = os.environ.get('WATCHDOG_USEC')
+        watchdog_pid = os.environ.get('WATCHDOG_PID')
+        if watchdog_usec and (not watchdog_pid or int(watchdog_pid) == os.getpid()):
+            self._watchdog_interval = int(watchdog_usec) / 1_000_000
+
+        self._socket: socket.socket = None
+        self._ready = False
+        self._last_heartbeat = time.monotonic()
+        self._logger = Logger().get_logger()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._address)
+
+    @property
+    def watchdog_interval(self) -> float:
+        return self._watchdog_interval
+
+    def notify(self, message: str) -> bool:
+        if not self._address:
+            return False
+
+        try:
+            if self._socket is None:
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.sendto(message.encode(), self._address)
+            return True
+        except OSError as e:
+            self._logger.debug(f'sd_notify failed: {e}')
+            return False
+
+    def ready(self) -> bool:
+        if self._ready:
+            return True
+        self._ready = self.notify('READY=1')
+        return self._ready
+
+    def status(self, status: str) -> bool:
+        return self.notify(f'STATUS={status}')
+
+    def stopping(self) -> bool:
+        return self.notify('STOPPING=1')
+
+    def watchdog(self) -> bool:
+        return self.notify('WATCHDOG=1')
+
+    def heartbeat(self) -> None:
+        """메인 루프가 한 바퀴 돌 때마다 호출한다."""
+        self._last_heartbeat = time.monotonic()
+
+    async def run_watchdog(self, stall_timeout: float):
+        """WatchdogSec의 절반 주기로 ping을 보낸다.
+
+        이벤트 루프가 블로킹되면 이 태스크도 돌지 못하고, 메인 루프가 stall_timeout 동안
+        heartbeat를 보내지 않으면 ping을 멈춰서 어느 쪽이든 systemd가 재시작하게 한다.
+        """
+        if self._watchdog_interval is None:
+            return
+
+        while True:
+            await asyncio.sleep(self._watchdog_interval / 2)
+            stalled_for = time.monotonic() - self._last_heartbeat
+            if stalled_for > stall_timeout:
+                self._logger.debug(f'Main loop stalled for {stalled_for:.0f} seconds, skip watchdog ping')
+                continue
+            self.watchdog()
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
@@ -1,25 +1,36 @@
-__all__ = ['get_mac_address', 'Logger']
+__all__ = ['get_mac_address', 'get_ip_address', 'get_env_flag', 'get_firmware_version', 'install_uvloop', 'Logger']
 
 
 import os
-import getmac
 import logging
 import threading
 import subprocess
 import re
+import socket
+
+
+_ble_mac_address: str = None
 
 
 def get_wifi_mac_address():
+    import getmac
+
     mac_address = getmac.get_mac_address()
     return mac_address
 
 
 def get_ble_mac_address() -> str:
+    # 어댑터 주소는 바뀌지 않으므로 한 번 읽은 값을 재사용한다. (hciconfig 실행 비용 절감)
+    global _ble_mac_address
+    if _ble_mac_address:
+        return _ble_mac_address
+
     try:
         output = subprocess.check_output(['hciconfig']).decode('utf-8')
         matches = re.findall(r'BD Address: ([0-9A-F:]+)', output)
         if matches:
-            return matches[0]
+            _ble_mac_address = matches[0]
+            return _ble_mac_address
         else:
             return None
     except Exception as e:
@@ -40,6 +51,56 @@ def get_mac_address(ble: bool = True) -> str:
         return None
 
 
+def get_ip_address() -> str:
+    # UDP connect는 패킷을 보내지 않고 기본 경로의 출발지 주소만 결정한다.
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(('8.8.8.8', 80))
+            return sock.getsockname()[0]
+    except OSError:
+        return None
+
+
+def get_env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('0', 'false', 'no', 'off', '')
+
+
+def get_firmware_version() -> str:
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        from importlib_metadata import version, PackageNotFoundError
+
+    try:
+        return version('ble-wifi-connector')
+    except PackageNotFoundError:
+        return ''
+
+
+def install_uvloop(enabled: bool = None) -> bool:
+    """uvloop이 설치되어 있으면 asyncio 이벤트 루프 정책으로 사용한다.
+
+    enabled가 None이면 BLE_WIFI_CONNECTOR_UVLOOP 환경 변수를 따른다. (기본값: 사용)
+    """
+    if enabled is None:
+        enabled = get_env_flag('BLE_WIFI_CONNECTOR_UVLOOP', True)
+    if not enabled:
+        return False
+
+    try:
+        import uvloop
+    except ImportError:
+        return False
+
+    import asyncio
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
 class Logger:
     _instance = None
     _lock = threading.Lock()
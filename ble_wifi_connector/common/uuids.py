@@ -0,0 +1,26 @@
+__all__ = ['HubWifiUUID', 'DeviceWifiUUID']
+
+
+# bless를 import하지 않고 (bleak만 쓰는 CLI 등에서) GATT UUID를 쓸 수 있도록 따로 둔다.
+
+
+class HubWifiUUID:
+    SERVICE = '540F0000-0000-0000-0000-000000000000'
+    SET_WIFI_SSID = '540F0001-0000-0000-0000-000000000000'
+    SET_WIFI_PW = '540F0002-0000-0000-0000-000000000000'
+    CONNECT_WIFI = '540F0003-0000-0000-0000-000000000000'
+    HUB_ID = '540F0004-0000-0000-0000-000000000000'
+    ERROR_CODE = '540F0005-0000-0000-0000-000000000000'
+    STATUS = '540F0006-0000-0000-0000-000000000000'
+    TRANSFER_CONTROL = '540F0007-0000-0000-0000-000000000000'
+    TRANSFER_DATA = '540F0008-0000-0000-0000-000000000000'
+
+
+class DeviceWifiUUID:
+    SERVICE = '640F0000-0000-0000-0000-000000000000'
+    SET_WIFI_SSID = '640F0001-0000-0000-0000-000000000000'
+    SET_WIFI_PW = '640F0002-0000-0000-0000-000000000000'
+    SET_BROKER_INFO = '640F0003-0000-0000-0000-000000000000'
+    CONNECT_WIFI = '640F0004-0000-0000-0000-000000000000'
+    THING_ID = '640F0005-0000-0000-0000-000000000000'
+    ERROR_CODE = '640F0006-0000-0000-0000-000000000000'
@@ -0,0 +1,171 @@
+__all__ = ['MiddlewareConfig', 'get_middleware_config', 'MIDDLEWARE_CONFIG_PATH']
+
+
+import os
+import struct
+import asyncio
+from typing import Callable, List, Optional
+
+from termcolor import colored
+
+from .common.utils import *
+
+
+MIDDLEWARE_CONFIG_PATH = '/usr/local/joi/middleware/middleware.cfg'
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def parse_middleware_identifier(text: str) -> Optional[str]:
+    for line in text.splitlines():
+        stripped_line: str = line.split('//')[0].strip()
+        if stripped_line.startswith('middleware_identifier'):
+            return stripped_line.split('=')[1].strip().strip('"')
+    return None
+
+
+class MiddlewareConfig:
+    """middleware.cfg를 한 번만 읽어 메모리에 두고, 파일이 바뀌면 다시 읽어서 리스너에게 알린다.
+
+    inotify를 쓸 수 없으면 poll_interval마다 파일의 mtime을 확인한다.
+    """
+
+    def __init__(self, path: str = MIDDLEWARE_CONFIG_PATH, poll_interval: float = 5) -> None:
+        self._path = path
+        self._poll_interval = poll_interval
+        self._identifier: Optional[str] = None
+        self._loaded = False
+        self._stat = None
+        self._listeners: List[Callable[[str], None]] = []
+        self._inotify_fd: int = None
+        self._poll_task: asyncio.Task = None
+        self._logger = Logger().get_logger()
+
+    @property
+    def identifier(self) -> Optional[str]:
+        if not self._loaded:
+            self.reload()
+        return self._identifier
+
+    @property
+    def hub_id(self) -> str:
+        mac_address = (get_mac_address() or '').replace(':', '').upper()
+        return f'{self.identifier or "DEFAULT"} {mac_address}'
+
+    def add_listener(self, listener: Callable[[str], None]):
+        """hub id가 바뀌면 새 hub id로 listener를 호출한다."""
+        self._listeners.append(listener)
+
+    def _read_stat(self):
+        try:
+            stat = os.stat(self._path)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def reload(self) -> bool:
+        """파일을 다시 읽는다. hub id가 바뀌었으면 True"""
+        previous = self.hub_id if self._loaded else None
+
+        self._stat = self._read_stat()
+        try:
+            with open(self._path, 'r') as file:
+                self._identifier = parse_middleware_identifier(file.read())
+        except FileNotFoundError:
+            self._identifier = None
+        self._loaded = True
+
+        hub_id = self.hub_id
+        if previous is None or hub_id == previous:
+            return False
+
+        self._logger.debug(colored(f'Middleware identifier changed: {previous} -> {hub_id}', 'green'))
+        for listener in self._listeners:
+            try:
+                listener(hub_id)
+            except Exception as e:
+                self._logger.debug(colored(f'Error occurred while notifying middleware config change: {e}', 'red'))
+        return True
+
+    def start_watching(self):
+        if self._inotify_fd is not None or self._poll_task is not None:
+            return
+        if not self._loaded:
+            self.reload()
+
+        if not self._start_inotify():
+            self._logger.debug(f'inotify not available, polling {self._path} every {self._poll_interval} seconds')
+            self._poll_task = asyncio.ensure_future(self._poll())
+
+    def stop_watching(self):
+        if self._inotify_fd is not None:
+            asyncio.get_event_loop().remove_reader(self._inotify_fd)
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    def _start_inotify(self) -> bool:
+        import ctypes
+        import ctypes.util
+
+        # 편집기는 보통 임시 파일을 만든 뒤 rename하므로 파일이 아니라 디렉터리를 감시한다.
+        directory = os.path.dirname(self._path) or '.'
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return False
+            mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+                os.close(fd)
+                return False
+        except (OSError, AttributeError):
+            return False
+
+        self._inotify_fd = fd
+        asyncio.get_event_loop().add_reader(fd, self._on_inotify_event)
+        return True
+
+    def _on_inotify_event(self):
+        try:
+            data = os.read(self._inotify_fd, 4096)
+        except BlockingIOError:
+            return
+
+        name = os.path.basename(self._path)
+        changed = False
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            event_name = data[offset + INOTIFY_EVENT.size : offset + INOTIFY_EVENT.size + length].rstrip(b'\0').decode(errors='ignore')
+            changed = changed or event_name == name
+            offset += INOTIFY_EVENT.size + length
+
+        if changed and self._read_stat() != self._stat:
+            self.reload()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            if self._read_stat() != self._stat:
+                self.reload()
+
+
+_middleware_config: MiddlewareConfig = None
+
+
+def get_middleware_config() -> MiddlewareConfig:
+    global _middleware_config
+    if _middleware_config is None:
+        _middleware_config = MiddlewareConfig()
+    return _middleware_config
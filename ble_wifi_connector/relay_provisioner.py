@@ -0,0 +1,245 @@
+__all__ = ['RelayProvisioner', 'write_device_wifi_credentials']
+
+
+import json
+import time
+import asyncio
+import fnmatch
+from collections import deque
+from dataclasses import asdict
+from typing import Callable, Deque, Dict, List, Set
+
+from termcolor import colored
+
+from .common.utils import *
+from .common.models import RelayOutcome
+from .common.uuids import DeviceWifiUUID
+
+
+MAX_RETRIES = 3
+
+
+async def _write_with_retry(client, char, value: bytes, done_message: str, error_message: str, echo: Callable[[str], None]) -> bool:
+    for attempt in range(MAX_RETRIES):
+        try:
+            await client.write_gatt_char(char, value)
+            echo(done_message)
+            return True
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1:
+                echo(f"Error {error_message} after {MAX_RETRIES} attempts: {e}")
+                return False
+            await asyncio.sleep(0.5)
+
+
+async def write_device_wifi_credentials(client, ssid: str, pw: str, broker_host: str, echo: Callable[[str], None] = print) -> bool:
+    """연결된 BleakClient로 스마트 디바이스의 DeviceWifiService에 WiFi와 브로커 정보를 쓴다.
+
+    CLI의 set_smart_device 모드와 허브의 릴레이 설정이 같이 쓴다.
+    """
+    # Wait for the client to be fully connected
+    await asyncio.sleep(1)
+
+    # Get the Device WiFi service and its characteristics
+    device_service = None
+    for service in client.services:
+        if service.uuid.upper() == DeviceWifiUUID.SERVICE.upper():
+            device_service = service
+            break
+
+    if not device_service:
+        echo("Error: Device WiFi service not found")
+        return False
+
+    # Find characteristics within the Device WiFi service
+    ssid_char = None
+    pw_char = None
+    broker_char = None
+    connect_char = None
+
+    ssid_uuid = DeviceWifiUUID.SET_WIFI_SSID
+    pw_uuid = DeviceWifiUUID.SET_WIFI_PW
+    broker_uuid = DeviceWifiUUID.SET_BROKER_INFO
+    connect_uuid = DeviceWifiUUID.CONNECT_WIFI
+
+    for char in device_service.characteristics:
+        if char.uuid.upper() == ssid_uuid.upper():
+            ssid_char = char
+        elif char.uuid.upper() == pw_uuid.upper():
+            pw_char = char
+        elif char.uuid.upper() == broker_uuid.upper():
+            broker_char = char
+        elif char.uuid.upper() == connect_uuid.upper():
+            connect_char = char
+
+    if not all([ssid_char, pw_char, broker_char]):
+        echo("Error: Required characteristics not found")
+        return False
+
+    # Write characteristics with retry logic
+    if not await _write_with_retry(client, ssid_char, ssid.encode(), "WiFi SSID set", "setting WiFi SSID", echo):
+        return False
+    if not await _write_with_retry(client, pw_char, pw.encode(), "WiFi password set", "setting WiFi password", echo):
+        return False
+    if not await _write_with_retry(client, broker_char, broker_host.encode(), "Broker info set", "setting broker info", echo):
+        return False
+    if connect_char:
+        if not await _write_with_retry(client, connect_char, bytearray([0x00]), "WiFi connection attempt", "triggering WiFi connection", echo):
+            return False
+    return True
+
+
+class RelayProvisioner:
+    """네트워크에 연결된 허브가 주변 스마트 디바이스에 WiFi와 브로커 정보를 대신 설정한다.
+
+    DeviceWifiService를 광고하는 디바이스를 백그라운드로 스캔하고, allow_list(이름 또는 주소의
+    fnmatch 패턴)에 맞는 새 디바이스를 최대 max_workers개까지 동시에 설정한다.
+    allow_list가 비어 있으면 스캔하지 않는다.
+    실패한 디바이스는 retry_interval이 지난 뒤 다시 발견되면 재시도한다.
+    """
+
+    def __init__(
+        self,
+        allow_list: List[str],
+        max_workers: int = 2,
+        retry_interval: float = 300,
+        connect_timeout: float = 20,
+        outcome_log_path: str = None,
+    ) -> None:
+        self._allow_list = list(allow_list or [])
+        self._max_workers = max(1, max_workers)
+        self._retry_interval = retry_interval
+        self._connect_timeout = connect_timeout
+        self._outcome_log_path = outcome_log_path
+
+        self._ssid = ''
+        self._password = ''
+        self._broker_host = ''
+
+        self._scanner = None
+        self._queue: asyncio.Queue = None
+        self._workers: List[asyncio.Task] = []
+        self._queued: Set[str] = set()
+        self._provisioned: Set[str] = set()
+        self._failed_at: Dict[str, float] = {}
+        self._outcomes: Deque[RelayOutcome] = deque(maxlen=100)
+        self._logger = Logger().get_logger()
+
+    @property
+    def outcomes(self) -> List[RelayOutcome]:
+        return list(self._outcomes)
+
+    def is_running(self) -> bool:
+        return self._scanner is not None
+
+    def set_credentials(self, ssid: str, password: str, broker_host: str):
+        credentials = (ssid, password, broker_host)
+        if credentials != (self._ssid, self._password, self._broker_host):
+            # 네트워크나 브로커가 바뀌면 이미 설정한 디바이스도 다시 설정 대상이 된다.
+            self._provisioned.clear()
+            self._failed_at.clear()
+        self._ssid, self._password, self._broker_host = credentials
+
+    def is_allowed(self, name: str, address: str) -> bool:
+        return any(fnmatch.fnmatchcase(name or '', pattern) or fnmatch.fnmatchcase(address.upper(), pattern.upper()) for pattern in self._allow_list)
+
+    async def start(self) -> bool:
+        if self._scanner is not None:
+            return True
+        if not self._allow_list:
+            self._logger.debug(colored(f'Relay provisioning disabled: allow list is empty', 'yellow'))
+            return False
+
+        from bleak import BleakScanner
+
+        self._queue = asyncio.Queue()
+        scanner = BleakScanner(detection_callback=self._on_detected, service_uuids=[DeviceWifiUUID.SERVICE.lower()])
+        try:
+            await scanner.start()
+        except Exception as e:
+            self._logger.debug(colored(f'Relay provisioning scan start failed: {e}', 'red'))
+            return False
+
+        self._scanner = scanner
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self._max_workers)]
+        self._logger.debug(colored(f'Relay provisioning started (workers: {self._max_workers}, allow list: {self._allow_list})', 'green'))
+        return True
+
+    async def stop(self):
+        if self._scanner is None:
+            return
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        try:
+            await self._scanner.stop()
+        except Exception as e:
+            self._logger.debug(colored(f'Relay provisioning scan stop failed: {e}', 'red'))
+        finally:
+            self._scanner = None
+            self._queued.clear()
+            self._logger.debug('Relay provisioning stopped...')
+
+    def _on_detected(self, device, advertisement_data):
+        address = device.address.upper()
+        if address in self._queued or address in self._provisioned:
+            return
+        if (failed_at := self._failed_at.get(address)) is not None and time.monotonic() - failed_at < self._retry_interval:
+            return
+
+        name = advertisement_data.local_name or device.name or ''
+        if not self.is_allowed(name, address):
+            return
+
+        self._queued.add(address)
+        self._queue.put_nowait((device, name))
+
+    async def _worker(self):
+        while True:
+            device, name = await self._queue.get()
+            try:
+                outcome = await self._provision(device, name)
+            finally:
+                self._queued.discard(device.address.upper())
+            self._record(outcome)
+
+    async def _provision(self, device, name: str) -> RelayOutcome:
+        from bleak import BleakClient
+
+        address = device.address.upper()
+        messages = []
+
+        def echo(message: str):
+            messages.append(message)
+            self._logger.debug(f'[relay {name} {address}] {message}')
+
+        try:
+            async with BleakClient(device, timeout=self._connect_timeout) as client:
+                success = await write_device_wifi_credentials(client, self._ssid, self._password, self._broker_host, echo)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            echo(f'Error connecting: {e}')
+            success = False
+
+        return RelayOutcome(address=address, name=name, success=success, message='' if success else messages[-1], finished_at=time.time())
+
+    def _record(self, outcome: RelayOutcome):
+        if outcome.success:
+            self._provisioned.add(outcome.address)
+            self._failed_at.pop(outcome.address, None)
+        else:
+            self._failed_at[outcome.address] = time.monotonic()
+
+        self._outcomes.append(outcome)
+        self._logger.debug(colored(f'Relay provisioning {outcome}', 'green' if outcome.success else 'red'))
+
+        if self._outcome_log_path:
+            try:
+                with open(self._outcome_log_path, 'a') as file:
+                    file.write(json.dumps(asdict(outcome)) + '\n')
+            except OSError as e:
+                self._logger.debug(colored(f'Failed to write relay provisioning log: {e}', 'red'))
@@ -0,0 +1,183 @@
+__all__ = ['SoftAPProvisioner']
+
+
+import json
+import string
+import asyncio
+import secrets
+from http import HTTPStatus
+from typing import Callable, Dict, Optional, Tuple
+
+from termcolor import colored
+
+from .common.utils import *
+from .chunked_transfer import TransferKind
+
+
+MAX_REQUEST_SIZE = 256 * 1024
+REQUEST_TIMEOUT = 10
+# WPA2 passphrase 길이
+MIN_PASSWORD_LENGTH = 8
+MAX_PASSWORD_LENGTH = 63
+# 화면이나 로그를 보고 옮겨 적기 쉽도록 헷갈리는 문자(0, O, 1, l, I)는 뺀다.
+GENERATED_PASSWORD_ALPHABET = ''.join(c for c in string.ascii_letters + string.digits if c not in '0O1lI')
+GENERATED_PASSWORD_LENGTH = 12
+
+
+class SoftAPProvisioner:
+    """BLE 대신 임시 AP와 HTTP로 자격 증명을 받는다.
+
+    POST /provision  {"ssid": ..., "password": ..., "broker_config": ..., "ca_certificate": ..., "wifi_enterprise_config": ...}
+    GET  /status     허브 상태 (status_provider의 결과)
+
+    network_manager는 start_access_point(ssid, password) -> 주소, stop_access_point()만 있으면 되므로
+    WiFiManager 대신 가짜 NetworkManager를 넘겨서 테스트할 수 있다.
+
+    자격 증명이 평문 HTTP로 오가므로 AP는 항상 WPA2로 띄운다. password가 None이면 임의로 만들고
+    AP를 띄울 때 로그에 남긴다. 8 ~ 63자가 아닌 password로는 AP를 띄우지 않는다.
+    """
+
+    def __init__(
+        self,
+        network_manager,
+        on_credentials: Callable[[str, str, str, Dict[int, bytes]], None],
+        ssid: str,
+        password: str = None,
+        port: int = 80,
+        status_provider: Callable[[], dict] = None,
+    ) -> None:
+        self._network_manager = network_manager
+        self._on_credentials = on_credentials
+        self._ssid = ssid
+        self._password_generated = password is None
+        self._password = password if password is not None else ''.join(secrets.choice(GENERATED_PASSWORD_ALPHABET) for _ in range(GENERATED_PASSWORD_LENGTH))
+        self._port = port
+        self._status_provider = status_provider or dict
+        self._server: asyncio.AbstractServer = None
+        self._address = ''
+        self._requested = False
+        self._logger = Logger().get_logger()
+
+    @property
+    def address(self) -> str:
+        return self._address
+
+    @property
+    def password(self) -> str:
+        return self._password
+
+    @property
+    def requested(self) -> bool:
+        return self._requested
+
+    def request(self):
+        """다음 BLE_ADVERTISE에서 시간과 관계없이 AP를 띄우도록 요청한다. (SIGUSR2)"""
+        self._logger.debug('SoftAP provisioning requested')
+        self._requested = True
+
+    def clear_request(self):
+        self._requested = False
+
+    def is_running(self) -> bool:
+        return self._server is not None
+
+    async def start(self) -> bool:
+        self._requested = False
+        if self._server is not None:
+            return True
+        if not MIN_PASSWORD_LENGTH <= len(self._password) <= MAX_PASSWORD_LENGTH:
+            self._logger.debug(colored(f'SoftAP disabled: password must be {MIN_PASSWORD_LENGTH} to {MAX_PASSWORD_LENGTH} characters', 'red'))
+            return False
+
+        if not (address := await self._network_manager.start_access_point(self._ssid, self._password)):
+            self._logger.debug(colored(f'SoftAP start failed: {self._ssid}', 'red'))
+            return False
+
+        try:
+            self._server = await asyncio.start_server(self._handle_connection, host=address, port=self._port)
+        except OSError as e:
+            self._logger.debug(colored(f'SoftAP HTTP server start failed: {e}', 'red'))
+            await self._network_manager.stop_access_point()
+            return False
+
+        self._address = address
+        # 직접 정한 password는 로그에 남기지 않는다.
+        password = f', password: {self._password}' if self._password_generated else ''
+        self._logger.debug(colored(f'SoftAP started: {self._ssid}{password}, http://{address}:{self._port}/provision', 'green'))
+        return True
+
+    async def stop(self):
+        if self._server is None:
+            return
+
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        self._address = ''
+        await self._network_manager.stop_access_point()
+        self._logger.debug('SoftAP stopped...')
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = (writer.get_extra_info('peername') or ('', 0))[0]
+        try:
+            method, path, body = await asyncio.wait_for(self._read_request(reader), REQUEST_TIMEOUT)
+            if body is None:
+                status, response, credentials = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': 'request too large'}, None
+            else:
+                status, response, credentials = self._route(method, path, body)
+
+            await self._write_response(writer, status, response)
+            # 응답을 보낸 뒤에 넘긴다. 자격 증명을 적용하려면 AP를 내려야 하기 때문이다.
+            if credentials is not None:
+                self._logger.debug(colored(f'wifi credentials is set via SoftAP! ssid: {credentials[0]} (client: {peer})', 'green'))
+                self._on_credentials(f'softap:{peer}', *credentials)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            self._logger.debug(colored(f'SoftAP request from {peer} failed: {e}', 'red'))
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Optional[bytes]]:
+        method, path, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        if length > MAX_REQUEST_SIZE:
+            return method, path, None
+        return method, path.split('?')[0], await reader.readexactly(length) if length else b''
+
+    def _route(self, method: str, path: str, body: bytes) -> Tuple[HTTPStatus, dict, Optional[tuple]]:
+        if path == '/status':
+            if method != 'GET':
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'use GET'}, None
+            return HTTPStatus.OK, self._status_provider(), None
+        if path != '/provision':
+            return HTTPStatus.NOT_FOUND, {'error': 'not found'}, None
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'use POST'}, None
+
+        try:
+            request = json.loads(body)
+            ssid, password = request['ssid'], request['password']
+            if not isinstance(ssid, str) or not isinstance(password, str) or not ssid or not password:
+                raise ValueError('ssid and password must be non-empty strings')
+            # BLE의 조각 전송으로 받는 값과 같은 종류를 한 번에 받는다.
+            payloads = {kind.value: request[kind.name.lower()].encode() for kind in TransferKind if isinstance(request.get(kind.name.lower()), str)}
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return HTTPStatus.BAD_REQUEST, {'error': f'invalid request: {e}'}, None
+
+        return HTTPStatus.ACCEPTED, {'result': 'accepted', 'ssid': ssid}, (ssid, password, payloads)
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: HTTPStatus, response: dict):
+        body = json.dumps(response).encode()
+        header = (
+            f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: close\r\n\r\n'
+        )
+        writer.write(header.encode() + body)
+        await writer.drain()
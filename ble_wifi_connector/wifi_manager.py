@@ -1,11 +1,20 @@
-__all__ = ['WiFiManager', 'validate_broker_address']
+__all__ = ['WiFiManager', 'LinkStatus', 'Uplink', 'UplinkType', 'UplinkPolicy', 'validate_broker_address', 'SOFTAP_CONNECTION_NAME']
 
 
 from ble_wifi_connector.common.utils import *
 
+import os
 import subprocess
 import asyncio
 import re
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Optional
+
+
+USB_TETHERING_DRIVERS = ('rndis_host', 'cdc_ether', 'cdc_ncm', 'ipheth')
+SOFTAP_CONNECTION_NAME = 'ble-wifi-connector-ap'
+SOFTAP_DEFAULT_ADDRESS = '10.42.0.1'  # NetworkManager shared 모드의 기본 주소
 
 
 def validate_broker_address(address: str) -> bool:
@@ -13,6 +22,34 @@ def validate_broker_address(address: str) -> bool:
     return bool(pattern.match(address))
 
 
+class UplinkType(Enum):
+    ETHERNET = 'ethernet'
+    WIFI = 'wifi'
+    USB = 'usb'
+
+
+class UplinkPolicy(Enum):
+    WIFI_ONLY = 'wifi_only'  # 기존 동작: 유선 연결이 있어도 BLE로 WiFi 설정을 기다린다.
+    WIRED = 'wired'  # 유선(Ethernet, USB 테더링) 업링크가 있으면 BLE 설정을 건너뛴다.
+    ANY = 'any'  # 이미 연결된 WiFi를 포함해 어떤 업링크든 있으면 BLE 설정을 건너뛴다.
+
+
+@dataclass
+class Uplink:
+    device: str
+    type: UplinkType
+
+    def __str__(self):
+        return f'{self.device} ({self.type.value})'
+
+
+@dataclass
+class LinkStatus:
+    ssid: str = ''
+    ipv4: str = ''
+    rssi: Optional[int] = None
+
+
 class WiFiManager:
     def __init__(self, ssid: str = '', password: str = ''):
         self._ssid = ssid
@@ -156,26 +193,162 @@ class WiFiManager:
             self._logger.debug(f"Error executing nmcli command: {e}")
             return False
 
+    async def _run_command(self, *args: str) -> str:
+        try:
+            process = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            stdout, stderr = await process.communicate()
+        except OSError as e:
+            self._logger.debug(f"Error executing {args[0]} command: {e}")
+            return ''
+
+        if process.returncode != 0:
+            self._logger.debug(f"{' '.join(args)} failed: {stderr.decode().strip()}")
+            return ''
+        return stdout.decode()
+
+    def _get_uplink_type(self, device: str, nm_type: str) -> Optional[UplinkType]:
+        if nm_type == 'wifi':
+            return UplinkType.WIFI
+        elif nm_type == 'ethernet':
+            # USB 테더링 장치도 NetworkManager에서는 ethernet으로 보이므로 드라이버로 구분한다.
+            driver = os.path.basename(os.path.realpath(f'/sys/class/net/{device}/device/driver'))
+            return UplinkType.USB if driver in USB_TETHERING_DRIVERS else UplinkType.ETHERNET
+        return None
+
+    async def get_uplinks(self) -> List[Uplink]:
+        uplinks = []
+        stdout = await self._run_command('nmcli', '-t', '-f', 'DEVICE,TYPE,STATE', 'dev', 'status')
+        for line in stdout.splitlines():
+            fields = line.split(':')
+            if len(fields) < 3 or not fields[2].strip().startswith('connected'):
+                continue
+
+            device = fields[0].strip()
+            if (uplink_type := self._get_uplink_type(device, fields[1].strip())) is not None:
+                uplinks.append(Uplink(device=device, type=uplink_type))
+        return uplinks
+
+    async def get_route_device(self, host: str) -> str:
+        stdout = await self._run_command('ip', 'route', 'get', host)
+        match = re.search(r'\bdev (\S+)', stdout)
+        return match.group(1) if match else ''
+
+    async def find_uplink(self, policy: UplinkPolicy, host: str) -> Optional[Uplink]:
+        """policy가 허용하는 업링크 중 host로 가는 경로가 있는 것을 찾는다."""
+        if policy == UplinkPolicy.WIFI_ONLY:
+            return None
+
+        route_device = await self.get_route_device(host)
+        if not route_device:
+            return None
+
+        for uplink in await self.get_uplinks():
+            if uplink.device != route_device:
+                continue
+            if policy == UplinkPolicy.WIRED and uplink.type == UplinkType.WIFI:
+                continue
+            return uplink
+        return None
+
+    def get_rssi(self, device: str) -> Optional[int]:
+        # /proc/net/wireless: "wlan0: 0000   58.  -52.  -256 ..." (level 열이 dBm)
+        try:
+            with open('/proc/net/wireless', 'r') as file:
+                for line in file:
+                    fields = line.split()
+                    if fields and fields[0] == f'{device}:':
+                        return int(float(fields[3]))
+        except (OSError, ValueError, IndexError):
+            pass
+        return None
+
+    async def get_link_status(self) -> LinkStatus:
+        device = await self.get_current_connected_wifi_device()
+        if not device:
+            return LinkStatus()
+
+        ipv4 = ''
+        stdout = await self._run_command('nmcli', '-g', 'IP4.ADDRESS', 'dev', 'show', device)
+        if stdout.strip():
+            ipv4 = stdout.split('|')[0].strip().split('/')[0]
+
+        return LinkStatus(ssid=await self.get_current_ssid(), ipv4=ipv4, rssi=self.get_rssi(device))
+
+    async def get_saved_password(self) -> str:
+        """현재 연결된 WiFi의 NetworkManager 연결 프로필에 저장된 비밀번호 (root 권한 필요)"""
+        device = await self.get_current_connected_wifi_device()
+        if not device:
+            return ''
+
+        connection = (await self._run_command('nmcli', '-g', 'GENERAL.CONNECTION', 'dev', 'show', device)).strip()
+        if not connection:
+            return ''
+
+        stdout = await self._run_command('nmcli', '-s', '-g', '802-11-wireless-security.psk', 'connection', 'show', connection)
+        # -g 출력은 ':'와 '\\'를 역슬래시로 이스케이프한다.
+        return re.sub(r'\\(.)', r'\1', stdout.rstrip('\n'))
+
+    async def get_wifi_device(self) -> str:
+        stdout = await self._run_command('nmcli', '-t', '-f', 'DEVICE,TYPE', 'dev', 'status')
+        for line in stdout.splitlines():
+            fields = line.split(':')
+            if len(fields) >= 2 and fields[1].strip() == 'wifi':
+                return fields[0].strip()
+        return ''
+
+    async def start_access_point(self, ssid: str, password: str, connection_name: str = SOFTAP_CONNECTION_NAME) -> str:
+        """WPA2 임시 AP를 띄우고 허브의 AP 주소를 돌려준다. 실패하면 ''
+
+        자격 증명을 평문으로 받으므로 암호 없는 AP는 띄우지 않는다. (password는 8 ~ 63자)
+        """
+        if not 8 <= len(password or '') <= 63:
+            self._logger.debug("Access point password must be 8 to 63 characters")
+            return ''
+
+        device = await self.get_wifi_device()
+        if not device:
+            self._logger.debug("No WiFi device for access point")
+            return ''
+
+        # 이전 실행에서 남은 프로필이 있으면 지우고 새로 만든다.
+        await self.stop_access_point(connection_name)
+        args = ['nmcli', 'connection', 'add', 'type', 'wifi', 'ifname', device, 'con-name', connection_name, 'autoconnect', 'no', 'ssid', ssid]
+        args += ['802-11-wireless.mode', 'ap', '802-11-wireless.band', 'bg', 'ipv4.method', 'shared']
+        args += ['wifi-sec.key-mgmt', 'wpa-psk', 'wifi-sec.psk', password]
+        if not await self._run_command(*args) or not await self._run_command('nmcli', 'connection', 'up', connection_name):
+            await self.stop_access_point(connection_name)
+            return ''
+
+        stdout = await self._run_command('nmcli', '-g', 'IP4.ADDRESS', 'connection', 'show', connection_name)
+        return stdout.split('|')[0].strip().split('/')[0] or SOFTAP_DEFAULT_ADDRESS
+
+    async def stop_access_point(self, connection_name: str = SOFTAP_CONNECTION_NAME) -> bool:
+        # 프로필을 지우면 AP도 내려간다.
+        if connection_name not in (await self._run_command('nmcli', '-g', 'NAME', 'connection', 'show')).splitlines():
+            return False
+        return bool(await self._run_command('nmcli', 'connection', 'delete', connection_name))
+
     def check_connection(self) -> bool:
         try:
             result = subprocess.run(
                 ["nmcli", "-t", "-f", "ACTIVE,SSID", "device", "wifi"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
             )
             active_connections = [line for line in result.stdout.split('\n') if line.startswith('yes:')]
-            if active_connections:
-                if not self._connected:
-                    self._logger.debug("WiFi connection status: connected")
-                self._connected = True
-                return True
-            else:
-                if self._connected:
-                    self._logger.debug("WiFi connection status: not connected")
-                self._connected = False
-                return False
+            return self._set_connected(bool(active_connections))
         except subprocess.CalledProcessError:
             self._logger.debug("Failed to check WiFi connection status")
             return False
 
+    async def is_connected(self) -> bool:
+        """check_connection과 같지만 이벤트 루프를 막지 않고, `nmcli dev wifi`와 달리 WiFi 스캔을 일으키지 않는다."""
+        return self._set_connected(any(uplink.type == UplinkType.WIFI for uplink in await self.get_uplinks()))
+
+    def _set_connected(self, connected: bool) -> bool:
+        if connected != self._connected:
+            self._logger.debug(f"WiFi connection status: {'connected' if connected else 'not connected'}")
+        self._connected = connected
+        return connected
+
 
 if __name__ == '__main__':
     import asyncio
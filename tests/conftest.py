@@ -0,0 +1,23 @@
+import os
+import socket
+
+import pytest
+
+from ble_wifi_connector.common.utils import Logger
+
+
+@pytest.fixture(autouse=True, scope='session')
+def logger(tmp_path_factory):
+    # 테스트 로그가 ./log/ble_wifi_manager.log에 섞이지 않도록 먼저 임시 파일로 만든다.
+    return Logger(log_file=str(tmp_path_factory.mktemp('log') / 'ble_wifi_manager.log')).get_logger()
+
+
+@pytest.fixture
+def notify_socket():
+    """abstract namespace의 NOTIFY_SOCKET을 흉내 내는 datagram 소켓"""
+    name = f'joi-test-notify-{os.getpid()}'
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind('\0' + name)
+    sock.setblocking(False)
+    yield f'@{name}', sock
+    sock.close()
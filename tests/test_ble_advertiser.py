@@ -0,0 +1,375 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('bless')
+
+from bless.backends.bluezdbus.server import BlessServerBlueZDBus
+from bless.backends.bluezdbus.dbus.application import BlueZGattApplication
+from bless.backends.bluezdbus.dbus.characteristic import BlueZGattCharacteristic
+
+from ble_wifi_connector import ble_advertiser as ble_advertiser_module
+from ble_wifi_connector.ble_advertiser import BLEAdvertiser, BLEErrorCode, AdvertisingMode, DeviceWifiService, HubWifiService, SESSION_TIMEOUT
+from ble_wifi_connector.common.uuids import DeviceWifiUUID, HubWifiUUID
+
+
+class FakeBus:
+    """dbus_next MessageBus 대신 export/unexport만 기록한다."""
+
+    def __init__(self) -> None:
+        self.exported = {}
+        self.log = []
+
+    def export(self, path, interface):
+        self.exported[path] = interface
+        self.log.append(('export', path))
+
+    def unexport(self, path, interface=None):
+        self.exported.pop(path, None)
+        self.log.append(('unexport', path))
+
+
+class FakeAdapter:
+    """BlueZ adapter 프록시 대신 호출을 기록한다. fail에 넣은 메서드는 예외를 던진다."""
+
+    def __init__(self) -> None:
+        self.calls = []
+        self.active = []
+        self.fail = set()
+
+    def get_interface(self, name):
+        adapter = self
+
+        class Interface:
+            def __getattr__(self, method):
+                async def call(*args):
+                    adapter.calls.append((method, args))
+                    if method in adapter.fail:
+                        raise Exception(f'{method} failed')
+                    if method == 'call_register_advertisement':
+                        adapter.active.append(args[0])
+                    elif method == 'call_unregister_advertisement':
+                        adapter.active.remove(args[0])
+                    elif method == 'call_get':
+                        return SimpleNamespace(value=len(adapter.active))
+
+                return call
+
+        return Interface()
+
+    def methods(self):
+        return [method for method, _ in self.calls if method != 'call_set']
+
+
+@pytest.fixture
+def fake_bluez(monkeypatch):
+    """bless 0.3.0의 BlueZ backend를 그대로 쓰고 system bus 연결만 가짜로 바꾼다."""
+
+    async def setup(server):
+        server.bus = FakeBus()
+        server.app = BlueZGattApplication(server.name, 'org.bluez', server.bus)
+        server.app.Read = server.read
+        server.app.Write = server.write
+        server.app.StartNotify = lambda characteristic: None
+        server.app.StopNotify = lambda characteristic: None
+        server.adapter = FakeAdapter()
+
+    monkeypatch.setattr(BlessServerBlueZDBus, 'setup', setup)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def server_of(advertiser: BLEAdvertiser):
+    return advertiser._server
+
+
+def snapshot(advertiser: BLEAdvertiser):
+    """등록된 광고의 (min interval, max interval, tx power)"""
+    return [(ad._min_interval, ad._max_interval, ad._tx_power) for ad in server_of(advertiser).app.advertisements]
+
+
+def test_clamps_interval_and_tx_power():
+    async def create(**kwargs):
+        return BLEAdvertiser(server_name='JOI Hub TEST', **kwargs)
+
+    advertiser = run(create(fast_interval=5, slow_interval=20000, tx_power=50))
+    assert (advertiser._fast_interval, advertiser._slow_interval, advertiser._tx_power) == (20, 10485, 20)
+
+    advertiser = run(create(tx_power=-200))
+    assert advertiser._tx_power == -127
+
+    advertiser = run(create())
+    assert advertiser._tx_power is None
+
+
+def test_advertising_mode_transitions(fake_bluez):
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST', fast_interval=50, slow_interval=2000, tx_power=4)
+        await advertiser.start()
+        server = server_of(advertiser)
+        steps = [snapshot(advertiser)]
+
+        for mode in (AdvertisingMode.SLOW, AdvertisingMode.PAUSED, AdvertisingMode.FAST):
+            server.adapter.calls.clear()
+            await advertiser.set_advertising_mode(mode)
+            steps.append((server.adapter.methods(), snapshot(advertiser), await advertiser.is_advertising()))
+
+        await advertiser.stop()
+        return steps
+
+    started, slow, paused, fast = run(scenario())
+    # start()는 bless 기본값(100 ms)으로 광고를 등록한 뒤 바로 fast 주기로 다시 등록한다.
+    assert started == [(50, 50, 4)]
+    assert slow == (['call_unregister_advertisement', 'call_register_advertisement'], [(2000, 2000, 4)], True)
+    assert paused == (['call_unregister_advertisement'], [], False)
+    assert fast == (['call_register_advertisement'], [(50, 50, 4)], True)
+
+
+def test_same_mode_does_not_reregister(fake_bluez):
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST', fast_interval=50)
+        await advertiser.start()
+        server = server_of(advertiser)
+        server.adapter.calls.clear()
+        await advertiser.set_advertising_mode(AdvertisingMode.FAST)
+        return server.adapter.methods()
+
+    assert run(scenario()) == []
+
+
+def test_boost_overrides_paused_mode(fake_bluez):
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST', fast_interval=50)
+        await advertiser.start()
+        await advertiser.set_advertising_mode(AdvertisingMode.PAUSED)
+        advertiser.boost(60)
+        await asyncio.sleep(0)
+        return advertiser.advertising_mode, snapshot(advertiser)
+
+    assert run(scenario()) == (AdvertisingMode.FAST, [(50, 50, 20)])
+
+
+def test_failed_registration_is_unexported(fake_bluez):
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST', fast_interval=50, slow_interval=2000)
+        await advertiser.start()
+        server = server_of(advertiser)
+        server.adapter.fail.add('call_register_advertisement')
+        await advertiser.set_advertising_mode(AdvertisingMode.SLOW)
+        failed = (snapshot(advertiser), [path for path in server.bus.exported if 'advertisement' in path])
+
+        # 다음 요청에서 다시 등록을 시도하고, stop()은 남은 광고 없이 GATT 앱만 내린다.
+        server.adapter.fail.clear()
+        await advertiser.set_advertising_mode(AdvertisingMode.SLOW)
+        recovered = snapshot(advertiser)
+        server.adapter.fail.add('call_register_advertisement')
+        await advertiser.set_advertising_mode(AdvertisingMode.FAST)
+        await advertiser.stop()
+        return failed, recovered, server.adapter.methods()[-1]
+
+    failed, recovered, last_call = run(scenario())
+    assert failed == ([], [])
+    assert recovered == [(2000, 2000, 20)]
+    assert last_call == 'call_unregister_application'
+
+
+def exported_paths(advertiser: BLEAdvertiser) -> set:
+    return {path for path in server_of(advertiser).bus.exported if '/service' in path}
+
+
+def test_add_and_remove_characteristic_on_live_server(fake_bluez):
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST', services=[HubWifiService(), DeviceWifiService()])
+        await advertiser.start()
+        server = server_of(advertiser)
+        before = exported_paths(advertiser)
+
+        server.adapter.calls.clear()
+        await advertiser.add_characteristic(DeviceWifiUUID.SERVICE, DeviceWifiService.ThingIDCharacteristic('thing-1'))
+        added = server.adapter.methods()
+        bless_char = server.get_service(DeviceWifiUUID.SERVICE).get_characteristic(DeviceWifiUUID.THING_ID)
+        added_paths = exported_paths(advertiser) - before
+
+        server.adapter.calls.clear()
+        await advertiser.remove_characteristic(DeviceWifiUUID.THING_ID)
+        removed = server.adapter.methods()
+        after_remove = exported_paths(advertiser)
+
+        # 같은 UUID를 다시 추가할 수 있다.
+        await advertiser.add_characteristic(DeviceWifiUUID.SERVICE, DeviceWifiService.ThingIDCharacteristic('thing-2'))
+        readded = server.get_service(DeviceWifiUUID.SERVICE).get_characteristic(DeviceWifiUUID.THING_ID)
+        return added, bytes(bless_char.value), added_paths, removed, after_remove == before, bytes(readded.value)
+
+    added, value, added_paths, removed, restored, readded_value = run(scenario())
+    # BlueZ는 등록할 때만 GATT 객체를 읽으므로 앱을 내렸다가 다시 등록해야 한다. 광고는 건드리지 않는다.
+    assert added == ['call_unregister_application', 'call_register_application']
+    assert value == b'thing-1'
+    assert len(added_paths) == 1
+    assert removed == ['call_unregister_application', 'call_register_application']
+    assert restored
+    assert readded_value == b'thing-2'
+
+
+def test_add_and_remove_service_on_live_server(fake_bluez):
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST')
+        await advertiser.start()
+        server = server_of(advertiser)
+        before = exported_paths(advertiser)
+
+        server.adapter.calls.clear()
+        await advertiser.add_service(DeviceWifiService())
+        added = (server.adapter.methods(), server.get_service(DeviceWifiUUID.SERVICE) is not None)
+
+        server.adapter.calls.clear()
+        await advertiser.remove_service(DeviceWifiUUID.SERVICE)
+        removed = (server.adapter.methods(), server.get_service(DeviceWifiUUID.SERVICE), exported_paths(advertiser) == before)
+
+        # 제거한 서비스와 같은 UUID로 다시 추가하면 새 서비스에 characteristic이 붙어야 한다.
+        await advertiser.add_service(DeviceWifiService())
+        service = server.get_service(DeviceWifiUUID.SERVICE)
+        readded = [char.uuid.upper() for char in service.characteristics]
+        return added, removed, readded, server.adapter.active
+
+    added, removed, readded, active_advertisements = run(scenario())
+    assert added == (['call_unregister_application', 'call_register_application'], True)
+    assert removed == (['call_unregister_application', 'call_register_application'], None, True)
+    assert readded == [char.uuid.upper() for char in DeviceWifiService().characteristics]
+    assert len(active_advertisements) == 1
+
+
+def test_primary_service_cannot_be_removed(fake_bluez):
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST')
+        await advertiser.start()
+        await advertiser.remove_service(HubWifiUUID.SERVICE)
+
+    with pytest.raises(ValueError):
+        run(scenario())
+
+
+def test_update_value_does_not_reregister(fake_bluez):
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST')
+        await advertiser.start()
+        server = server_of(advertiser)
+        server.adapter.calls.clear()
+        updated = advertiser.update_characteristic_value(HubWifiUUID.HUB_ID, b'hub-2')
+        gatt = server.get_service(HubWifiUUID.SERVICE).get_characteristic(HubWifiUUID.HUB_ID).gatt
+        return updated, bytes(gatt.Value), server.adapter.methods(), advertiser.update_characteristic_value(DeviceWifiUUID.THING_ID, b'x')
+
+    assert run(scenario()) == (True, b'hub-2', [], False)
+
+
+def test_changes_before_start_are_applied_on_start(fake_bluez):
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST', services=[HubWifiService(), DeviceWifiService()])
+        await advertiser.add_characteristic(DeviceWifiUUID.SERVICE, DeviceWifiService.ThingIDCharacteristic('thing-1'))
+        await advertiser.remove_characteristic(HubWifiUUID.STATUS)
+        await advertiser.start()
+        server = server_of(advertiser)
+        thing_id = server.get_service(DeviceWifiUUID.SERVICE).get_characteristic(DeviceWifiUUID.THING_ID)
+        return bytes(thing_id.value), server.get_service(HubWifiUUID.SERVICE).get_characteristic(HubWifiUUID.STATUS)
+
+    assert run(scenario()) == (b'thing-1', None)
+
+
+def central(address: str) -> dict:
+    return {'device': f'/org/bluez/hci0/dev_{address.replace(":", "_")}'}
+
+
+def write(advertiser: BLEAdvertiser, uuid: str, value: bytes, options: dict):
+    """BlueZ가 보내는 WriteValue(value, options) 호출을 흉내 낸다."""
+    gatt = server_of(advertiser).get_characteristic(uuid).gatt
+    BlueZGattCharacteristic.WriteValue.__dict__['__DBUS_METHOD'].fn(gatt, value, options)
+
+
+def read(advertiser: BLEAdvertiser, uuid: str, options: dict) -> bytes:
+    gatt = server_of(advertiser).get_characteristic(uuid).gatt
+    return bytes(BlueZGattCharacteristic.ReadValue.__dict__['__DBUS_METHOD'].fn(gatt, options))
+
+
+def test_sessions_are_isolated_per_central(fake_bluez, caplog):
+    phone, tablet = central('AA:AA:AA:AA:AA:AA'), central('BB:BB:BB:BB:BB:BB')
+
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST')
+        await advertiser.start()
+
+        # 두 central이 번갈아 써도 서로의 값을 덮어쓰지 않는다.
+        write(advertiser, HubWifiUUID.SET_WIFI_SSID, b'phone-ssid', phone)
+        write(advertiser, HubWifiUUID.SET_WIFI_SSID, b'tablet-ssid', tablet)
+        write(advertiser, HubWifiUUID.SET_WIFI_PW, b'phone-secret', phone)
+        write(advertiser, HubWifiUUID.CONNECT_WIFI, b'\x01', tablet)
+        write(advertiser, HubWifiUUID.CONNECT_WIFI, b'\x01', phone)
+
+        credentials = await advertiser.wait_until_wifi_credentials_set(timeout=1)
+        error_codes = [int.from_bytes(read(advertiser, HubWifiUUID.ERROR_CODE, options), 'little', signed=True) for options in (phone, tablet)]
+        return credentials, advertiser.active_session.address, error_codes
+
+    with caplog.at_level(logging.DEBUG):
+        credentials, active_address, error_codes = run(scenario())
+
+    assert credentials == ('phone-ssid', 'phone-secret', BLEErrorCode.NO_ERROR)
+    assert active_address == 'AA:AA:AA:AA:AA:AA'
+    assert error_codes == [BLEErrorCode.NO_ERROR.value, BLEErrorCode.WIFI_CREDENTIAL_NOT_SET.value]
+    assert 'phone-ssid' in caplog.text
+    assert 'phone-secret' not in caplog.text
+
+
+def test_stale_sessions_expire(fake_bluez, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ble_advertiser_module, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    phone, tablet = central('AA:AA:AA:AA:AA:AA'), central('BB:BB:BB:BB:BB:BB')
+
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST')
+        await advertiser.start()
+        write(advertiser, HubWifiUUID.SET_WIFI_SSID, b'phone-ssid', phone)
+        write(advertiser, HubWifiUUID.SET_WIFI_SSID, b'tablet-ssid', tablet)
+
+        # SESSION_TIMEOUT이 지나기 전에는 남아 있다.
+        now[0] += SESSION_TIMEOUT
+        write(advertiser, HubWifiUUID.SET_WIFI_PW, b'tablet-secret', tablet)
+        before = sorted(session.address for session in advertiser.sessions)
+
+        # 오래 쓰이지 않은 세션은 다음 요청 때 정리되고, 다시 연결하면 빈 세션으로 시작한다.
+        now[0] += 1
+        write(advertiser, HubWifiUUID.SET_WIFI_PW, b'tablet-secret', tablet)
+        after = sorted(session.address for session in advertiser.sessions)
+        now[0] += SESSION_TIMEOUT + 1
+        write(advertiser, HubWifiUUID.SET_WIFI_PW, b'phone-secret', phone)
+        phone_session = next(session for session in advertiser.sessions if session.address == 'AA:AA:AA:AA:AA:AA')
+        return before, after, [session.address for session in advertiser.sessions], phone_session.ssid
+
+    before, after, last, phone_ssid = run(scenario())
+    assert before == ['AA:AA:AA:AA:AA:AA', 'BB:BB:BB:BB:BB:BB']
+    assert after == ['BB:BB:BB:BB:BB:BB']
+    assert last == ['AA:AA:AA:AA:AA:AA']
+    assert phone_ssid == ''
+
+
+def test_active_session_does_not_expire(fake_bluez, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ble_advertiser_module, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    phone, tablet = central('AA:AA:AA:AA:AA:AA'), central('BB:BB:BB:BB:BB:BB')
+
+    async def scenario():
+        advertiser = BLEAdvertiser(server_name='JOI Hub TEST')
+        await advertiser.start()
+        write(advertiser, HubWifiUUID.SET_WIFI_SSID, b'phone-ssid', phone)
+        write(advertiser, HubWifiUUID.SET_WIFI_PW, b'phone-secret', phone)
+        write(advertiser, HubWifiUUID.CONNECT_WIFI, b'\x01', phone)
+        await advertiser.wait_until_wifi_credentials_set(timeout=1)
+
+        # 연결을 시도하는 동안 오래 걸려도 결과를 남길 세션은 지우지 않는다.
+        now[0] += SESSION_TIMEOUT + 1
+        write(advertiser, HubWifiUUID.SET_WIFI_SSID, b'tablet-ssid', tablet)
+        advertiser.set_error_code(BLEErrorCode.WIFI_CONNECT_TIMEOUT)
+        return int.from_bytes(read(advertiser, HubWifiUUID.ERROR_CODE, phone), 'little', signed=True)
+
+    assert run(scenario()) == BLEErrorCode.WIFI_CONNECT_TIMEOUT.value
@@ -0,0 +1,73 @@
+import time
+import asyncio
+
+import pytest
+
+pytest.importorskip('zeroconf')
+
+from zeroconf.asyncio import AsyncServiceInfo, AsyncZeroconf
+
+from ble_wifi_connector.broker_discovery import BROKER_SERVICE_TYPE, BrokerAnnouncer, BrokerDiscovery
+
+
+def test_announce_and_resolve():
+    async def run():
+        announcer = BrokerAnnouncer(port=1884, name='JOI Hub TEST announce')
+        discovery = BrokerDiscovery()
+        try:
+            assert await announcer.start('127.0.0.1')
+            record = await discovery.resolve(5)
+            # 두 번째 조회는 캐시에서 바로 돌려준다.
+            assert discovery.get_cached() == record
+            return record
+        finally:
+            await discovery.close()
+            await announcer.stop()
+
+    record = asyncio.run(run())
+    assert record is not None
+    assert record.name == f'JOI Hub TEST announce.{BROKER_SERVICE_TYPE}'
+    assert (record.host, record.port) == ('127.0.0.1', 1884)
+
+
+def test_resolve_again_after_ttl_expired():
+    async def run():
+        zeroconf = AsyncZeroconf(interfaces=['127.0.0.1'])
+        info = AsyncServiceInfo(
+            BROKER_SERVICE_TYPE,
+            f'JOI Hub TEST ttl.{BROKER_SERVICE_TYPE}',
+            port=1885,
+            parsed_addresses=['127.0.0.1'],
+            server='joi-hub-test-ttl.local.',
+            host_ttl=2,
+        )
+        await zeroconf.async_register_service(info)
+        discovery = BrokerDiscovery()
+        try:
+            first = await discovery.resolve(5)
+            assert first is not None
+            assert first.expires_at - time.monotonic() <= 2
+
+            await asyncio.sleep(2.5)
+            assert discovery.get_cached() is None
+            # 브라우저가 이미 알고 있는 서비스도 다시 물어서 찾는다.
+            return await discovery.resolve(5)
+        finally:
+            await discovery.close()
+            await zeroconf.async_unregister_service(info)
+            await zeroconf.async_close()
+
+    record = asyncio.run(run())
+    assert record is not None
+    assert record.port == 1885
+
+
+def test_resolve_times_out_without_broker():
+    async def run():
+        discovery = BrokerDiscovery(service_type='_joi-test-none._tcp.local.')
+        try:
+            return await discovery.resolve(0.5)
+        finally:
+            await discovery.close()
+
+    assert asyncio.run(run()) is None
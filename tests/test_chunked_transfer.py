@@ -0,0 +1,191 @@
+import os
+import asyncio
+
+import pytest
+
+from ble_wifi_connector.chunked_transfer import (
+    ChunkReceiver,
+    ChunkSender,
+    TransferAck,
+    TransferKind,
+    TransferStatus,
+    get_chunk_size,
+    send_chunked,
+)
+
+
+MTU = 23
+
+
+def start(receiver: ChunkReceiver, sender: ChunkSender) -> TransferAck:
+    ack = TransferAck.unpack(receiver.control(sender.start_packet(), MTU))
+    sender.set_chunk_size(ack.chunk_size)
+    return ack
+
+
+class FakeClient:
+    """BleakClient 대신 ChunkReceiver에 바로 쓴다.
+
+    drop(seq, count)가 True인 조각과 drop_ack(next_seq, count)가 True인 ACK 알림은 버린다.
+    """
+
+    def __init__(self, receiver: ChunkReceiver, drop=None, drop_ack=None) -> None:
+        self.mtu_size = MTU
+        self._receiver = receiver
+        self._drop = drop or (lambda seq, count: False)
+        self._drop_ack = drop_ack or (lambda next_seq, count: False)
+        self._sent = {}
+        self._acked = {}
+        self._callback = None
+
+    async def start_notify(self, char, callback):
+        self._callback = callback
+
+    async def stop_notify(self, char):
+        self._callback = None
+
+    async def write_gatt_char(self, char, data: bytes, response: bool = False):
+        if char == 'control':
+            ack = self._receiver.control(bytes(data), self.mtu_size)
+        else:
+            seq = int.from_bytes(data[:2], 'little')
+            self._sent[seq] = count = self._sent.get(seq, 0) + 1
+            if self._drop(seq, count):
+                return
+            ack = self._receiver.receive(bytes(data))
+            if ack is not None:
+                next_seq = TransferAck.unpack(ack).next_seq
+                self._acked[next_seq] = count = self._acked.get(next_seq, 0) + 1
+                if self._drop_ack(next_seq, count):
+                    return
+        if ack is not None:
+            self._callback(char, bytearray(ack))
+
+
+def test_round_trip():
+    payload = os.urandom(1000)
+    receiver = ChunkReceiver()
+    sender = ChunkSender(payload, TransferKind.CA_CERTIFICATE)
+
+    ack = start(receiver, sender)
+    assert ack.status == TransferStatus.ACK
+    assert ack.chunk_size == get_chunk_size(MTU)
+
+    while ack.status == TransferStatus.ACK:
+        acks = [a for packet in sender.window_packets(ack.next_seq, ack.window) if (a := receiver.receive(packet)) is not None]
+        assert len(acks) == 1
+        ack = sender.parse_ack(acks[0])
+
+    assert ack.status == TransferStatus.DONE
+    assert receiver.kind == TransferKind.CA_CERTIFICATE
+    assert receiver.payload == payload
+
+
+def test_gap_is_nacked_once():
+    payload = os.urandom(200)
+    receiver = ChunkReceiver()
+    sender = ChunkSender(payload)
+    ack = start(receiver, sender)
+    packets = sender.window_packets(0, ack.window)
+
+    assert receiver.receive(packets[0]) is None
+    nack = sender.parse_ack(receiver.receive(packets[2]))
+    assert nack.status == TransferStatus.ACK
+    assert nack.next_seq == 1
+    # 같은 빈자리는 다시 알리지 않는다.
+    assert receiver.receive(packets[3]) is None
+
+    # 빈자리부터 다시 보내면 이어서 받는다.
+    for packet in sender.window_packets(nack.next_seq, nack.window):
+        if (data := receiver.receive(packet)) is not None:
+            ack = sender.parse_ack(data)
+    assert ack.status == TransferStatus.DONE
+    assert receiver.payload == payload
+
+
+def test_tail_loss_is_retransmitted():
+    payload = os.urandom(100)
+    receiver = ChunkReceiver()
+    last_seq = (len(payload) - 1) // get_chunk_size(MTU)
+    # 마지막 조각을 처음 한 번 잃으면 빈자리를 알릴 다음 조각이 없어서 ACK가 오지 않는다.
+    client = FakeClient(receiver, drop=lambda seq, count: seq == last_seq and count == 1)
+
+    stats = asyncio.run(send_chunked(client, 'control', 'data', payload, echo=lambda message: None, ack_timeout=0.05))
+
+    assert stats.status == TransferStatus.DONE
+    assert stats.retransmits == 1
+    assert receiver.payload == payload
+
+
+def test_duplicate_window_is_reacked_once_per_retransmit():
+    payload = os.urandom(200)
+    receiver = ChunkReceiver()
+    sender = ChunkSender(payload)
+    ack = start(receiver, sender)
+    first_window = sender.window_packets(0, 4)
+    for packet in first_window:
+        receiver.receive(packet)
+
+    # 재전송 한 번에는 한 번만 다시 알린다.
+    reacks = [data for packet in first_window if (data := receiver.receive(packet)) is not None]
+    assert [sender.parse_ack(data).next_seq for data in reacks] == [4]
+    # 다음 재전송은 window 앞에서 다시 시작하므로 또 알린다.
+    reacks = [data for packet in first_window if (data := receiver.receive(packet)) is not None]
+    assert [sender.parse_ack(data).next_seq for data in reacks] == [4]
+
+
+def test_lost_reack_is_sent_again():
+    payload = os.urandom(400)
+    receiver = ChunkReceiver(window_bytes=4 * get_chunk_size(MTU))
+    # 첫 window의 ACK와 그 뒤 재전송에 대한 ACK까지 잃는다.
+    client = FakeClient(receiver, drop_ack=lambda next_seq, count: next_seq == 4 and count <= 2)
+
+    stats = asyncio.run(send_chunked(client, 'control', 'data', payload, echo=lambda message: None, ack_timeout=0.05, max_retries=2))
+
+    assert stats.status == TransferStatus.DONE
+    assert stats.retransmits == 2
+    assert receiver.payload == payload
+
+
+def test_gives_up_after_max_retries():
+    receiver = ChunkReceiver()
+    client = FakeClient(receiver, drop=lambda seq, count: True)
+
+    stats = asyncio.run(send_chunked(client, 'control', 'data', os.urandom(100), echo=lambda message: None, ack_timeout=0.01, max_retries=2))
+
+    assert stats.status == TransferStatus.ABORTED
+    assert receiver.status == TransferStatus.ABORTED
+
+
+def test_crc_error():
+    payload = os.urandom(50)
+    receiver = ChunkReceiver()
+    sender = ChunkSender(payload)
+    ack = start(receiver, sender)
+
+    packets = sender.window_packets(0, ack.window)
+    packets[-1] = packets[-1][:-1] + bytes([packets[-1][-1] ^ 0xFF])
+    acks = [a for packet in packets if (a := receiver.receive(packet)) is not None]
+
+    assert sender.parse_ack(acks[-1]).status == TransferStatus.CRC_ERROR
+    assert receiver.payload is None
+
+
+def test_too_large():
+    receiver = ChunkReceiver(max_size=10)
+    ack = start(receiver, ChunkSender(os.urandom(11)))
+
+    assert ack.status == TransferStatus.TOO_LARGE
+    assert receiver.receive(b'\x00\x00' + b'x') is None
+
+
+def test_sender_rejects_payload_over_limit():
+    with pytest.raises(ValueError):
+        ChunkSender(bytes(64 * 1024 + 1))
+
+
+def test_ack_of_other_transfer_is_ignored():
+    sender = ChunkSender(b'abc', transfer_id=1)
+    other = TransferAck(2, TransferStatus.DONE, 0, 1, 1).pack()
+
+    assert sender.parse_ack(other) is None
@@ -0,0 +1,210 @@
+import os
+import signal
+import socket
+import asyncio
+
+import pytest
+
+pytest.importorskip('bless')
+
+from ble_wifi_connector import __main__ as main_module
+from ble_wifi_connector.ble_advertiser import BLEErrorCode, AdvertisingMode
+from ble_wifi_connector.common.models import StatusSnapshot
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def receive_all(sock: socket.socket) -> list:
+    messages = []
+    while True:
+        try:
+            messages.append(sock.recv(1024).decode())
+        except BlockingIOError:
+            return messages
+
+
+class FakeAdvertiser:
+    """BLEAdvertiser 대신 쓴다. fail_start가 True면 bluetoothd가 없을 때처럼 start()가 예외를 던진다."""
+
+    fail_start = False
+    instances = []
+
+    def __init__(self, **kwargs) -> None:
+        self.status = StatusSnapshot()
+        self.advertising_mode = AdvertisingMode.FAST
+        self.start_calls = 0
+        self._started = False
+        self._credentials: asyncio.Queue = asyncio.Queue()
+        FakeAdvertiser.instances.append(self)
+
+    async def start(self):
+        self.start_calls += 1
+        if self.fail_start:
+            raise Exception('org.freedesktop.DBus.Error.ServiceUnknown')
+        self._started = True
+
+    async def stop(self):
+        self._started = False
+
+    def is_started(self) -> bool:
+        return self._started
+
+    async def is_advertising(self) -> bool:
+        return self._started
+
+    async def set_advertising_mode(self, mode: AdvertisingMode):
+        self.advertising_mode = mode
+
+    def boost(self, duration: float):
+        pass
+
+    def watch_middleware_config(self, middleware_config=None):
+        pass
+
+    def update_status(self, **fields):
+        for name, value in fields.items():
+            setattr(self.status, name, value)
+
+    def set_error_code(self, error_code: BLEErrorCode, session=None):
+        pass
+
+    def submit_credentials(self, address: str, ssid: str, password: str, payloads=None):
+        self._credentials.put_nowait((ssid, password, BLEErrorCode.NO_ERROR))
+
+    async def wait_until_wifi_credentials_set(self, timeout: float = 30):
+        try:
+            return await asyncio.wait_for(self._credentials.get(), timeout)
+        except asyncio.TimeoutError:
+            return ('', '', BLEErrorCode.WIFI_CONNECT_TIMEOUT)
+
+
+class FakeWiFiManager:
+    """업링크가 없는 허브. nmcli 대신 AP 요청만 기록한다."""
+
+    def __init__(self) -> None:
+        self.started = []
+        self.stopped = 0
+
+    async def start_access_point(self, ssid: str, password: str) -> str:
+        self.started.append((ssid, password))
+        return '127.0.0.1'
+
+    async def stop_access_point(self) -> bool:
+        self.stopped += 1
+        return True
+
+    async def find_uplink(self, policy, target):
+        # nmcli를 기다리는 것처럼 양보해야 상태 머신이 멈추지 않고 돌아도 테스트가 끝난다.
+        await asyncio.sleep(0)
+        return None
+
+    async def is_connected(self) -> bool:
+        await asyncio.sleep(0)
+        return False
+
+
+class FakeBrokerAnnouncer:
+    def __init__(self, **kwargs) -> None:
+        pass
+
+    async def start(self, address):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class FakeMiddlewareConfig:
+    def stop_watching(self):
+        pass
+
+
+@pytest.fixture
+def hub(monkeypatch, notify_socket):
+    address, sock = notify_socket
+    monkeypatch.setenv('NOTIFY_SOCKET', address)
+    monkeypatch.delenv('WATCHDOG_USEC', raising=False)
+
+    wifi_manager = FakeWiFiManager()
+    FakeAdvertiser.fail_start = False
+    FakeAdvertiser.instances = []
+    monkeypatch.setattr(main_module, 'BLEAdvertiser', FakeAdvertiser)
+    monkeypatch.setattr(main_module, 'WiFiManager', lambda: wifi_manager)
+    monkeypatch.setattr(main_module, 'BrokerAnnouncer', FakeBrokerAnnouncer)
+    monkeypatch.setattr(main_module, 'get_middleware_config', FakeMiddlewareConfig)
+    monkeypatch.setattr(main_module, 'get_mac_address', lambda: 'aa:bb:cc:dd:ee:ff')
+    monkeypatch.setattr(main_module, 'EVENT_LOOP_TIME_OUT', 0.0001)
+    monkeypatch.setattr(main_module, 'UPLINK_CHECK_INTERVAL', 0.05)
+    monkeypatch.setattr(main_module, 'SOFTAP_AFTER', 0)
+    monkeypatch.setattr(main_module, 'SOFTAP_PASSWORD', None)
+    monkeypatch.setattr(main_module, 'SOFTAP_PORT', get_free_port())
+    return wifi_manager, sock
+
+
+def run_until(condition, before=None, timeout: float = 3):
+    """main_event_loop를 condition이 참이 될 때까지 돌린 뒤 SIGTERM처럼 취소하고 결과를 돌려준다."""
+
+    async def run():
+        task = asyncio.ensure_future(main_module.main_event_loop())
+        try:
+            await asyncio.sleep(0.05)
+            if before is not None:
+                before()
+            while not condition():
+                assert not task.done()
+                await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+            result = await asyncio.wait_for(task, timeout)
+        return result
+
+    return asyncio.run(asyncio.wait_for(run(), timeout))
+
+
+def test_softap_opens_when_ble_fails_to_start(hub):
+    wifi_manager, sock = hub
+    FakeAdvertiser.fail_start = True
+
+    # SOFTAP_AFTER가 0이어도 BLE를 쓸 수 없으면 바로 AP를 띄운다.
+    assert run_until(lambda: wifi_manager.started) == 0
+
+    ssid, password = wifi_manager.started[0]
+    assert ssid == 'JOI Hub Setup DDEEFF'
+    assert len(password) >= 8
+    messages = receive_all(sock)
+    assert 'READY=1' in messages
+    assert 'STATUS=BLE_ADVERTISE' in messages
+    assert messages[-1] == 'STOPPING=1'
+    # SHUTDOWN에서 AP를 내린다. (처음 한 번은 이전 실행이 남긴 프로필 정리)
+    assert wifi_manager.stopped == 2
+
+
+def test_ble_is_retried_while_softap_is_open(hub):
+    wifi_manager, _ = hub
+    FakeAdvertiser.fail_start = True
+
+    run_until(lambda: FakeAdvertiser.instances and FakeAdvertiser.instances[0].start_calls >= 3)
+
+    # 이미 띄운 AP는 다시 띄우지 않는다.
+    assert len(wifi_manager.started) == 1
+
+
+def test_sigusr2_opens_softap_while_ble_works(hub):
+    wifi_manager, sock = hub
+
+    run_until(lambda: wifi_manager.started, before=lambda: os.kill(os.getpid(), signal.SIGUSR2))
+
+    assert FakeAdvertiser.instances[0].is_started() is False  # SHUTDOWN에서 내렸다.
+    assert 'READY=1' in receive_all(sock)
+
+
+def test_softap_is_not_opened_without_request(hub):
+    wifi_manager, sock = hub
+
+    run_until(lambda: 'READY=1' in receive_all(sock))
+
+    assert wifi_manager.started == []
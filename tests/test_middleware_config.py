@@ -0,0 +1,149 @@
+import os
+import asyncio
+
+import pytest
+
+from ble_wifi_connector import middleware_config as middleware_config_module
+from ble_wifi_connector.middleware_config import MiddlewareConfig, parse_middleware_identifier
+
+
+CONFIG = '''
+// JOI middleware
+middleware_identifier = "{identifier}" // hub name
+mqtt_port = 1883
+'''
+
+
+@pytest.fixture(autouse=True)
+def mac_address(monkeypatch):
+    monkeypatch.setattr(middleware_config_module, 'get_mac_address', lambda: 'aa:bb:cc:dd:ee:ff')
+
+
+def write_config(path, identifier: str):
+    # 편집기처럼 임시 파일에 쓴 뒤 rename한다.
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as file:
+        file.write(CONFIG.format(identifier=identifier))
+    os.replace(temp_path, path)
+
+
+async def wait_for(condition, timeout: float = 2):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.parametrize(
+    'text, expected',
+    [
+        (CONFIG.format(identifier='Living Room'), 'Living Room'),
+        ('middleware_identifier=plain', 'plain'),
+        ('// middleware_identifier = "commented"\n', None),
+        ('mqtt_port = 1883\n', None),
+    ],
+)
+def test_parse_middleware_identifier(text, expected):
+    assert parse_middleware_identifier(text) == expected
+
+
+def test_hub_id_is_read_once_and_defaults_without_file(tmp_path):
+    path = tmp_path / 'middleware.cfg'
+    config = MiddlewareConfig(str(path))
+    assert config.hub_id == 'DEFAULT AABBCCDDEEFF'
+
+    # reload() 전에는 파일을 다시 읽지 않는다.
+    write_config(path, 'A')
+    assert config.hub_id == 'DEFAULT AABBCCDDEEFF'
+    assert config.reload()
+    assert config.hub_id == 'A AABBCCDDEEFF'
+
+
+def test_reload_notifies_listeners_only_on_change(tmp_path):
+    path = tmp_path / 'middleware.cfg'
+    write_config(path, 'A')
+    config = MiddlewareConfig(str(path))
+    received = []
+
+    def broken_listener(hub_id):
+        raise RuntimeError('listener failed')
+
+    config.add_listener(broken_listener)
+    config.add_listener(received.append)
+
+    # 처음 읽을 때는 알리지 않는다.
+    assert not config.reload()
+    assert not config.reload()
+    write_config(path, 'B')
+    assert config.reload()
+    path.unlink()
+    assert config.reload()
+
+    assert received == ['B AABBCCDDEEFF', 'DEFAULT AABBCCDDEEFF']
+
+
+def test_watching_with_inotify(tmp_path):
+    path = tmp_path / 'middleware.cfg'
+    write_config(path, 'A')
+    config = MiddlewareConfig(str(path), poll_interval=60)
+    received = []
+    config.add_listener(received.append)
+
+    async def run():
+        config.start_watching()
+        try:
+            if config._inotify_fd is None:
+                pytest.skip('inotify is not available')
+            write_config(path, 'B')
+            await wait_for(lambda: received)
+        finally:
+            config.stop_watching()
+
+    asyncio.run(run())
+    assert received == ['B AABBCCDDEEFF']
+
+
+def test_watching_falls_back_to_polling(tmp_path, monkeypatch):
+    path = tmp_path / 'middleware.cfg'
+    write_config(path, 'A')
+    config = MiddlewareConfig(str(path), poll_interval=0.05)
+    monkeypatch.setattr(config, '_start_inotify', lambda: False)
+    received = []
+    config.add_listener(received.append)
+
+    async def run():
+        config.start_watching()
+        try:
+            assert config._poll_task is not None
+            write_config(path, 'B')
+            await wait_for(lambda: received)
+            # 내용이 그대로면 다시 알리지 않는다.
+            await asyncio.sleep(0.15)
+        finally:
+            config.stop_watching()
+        assert config._poll_task is None
+
+    asyncio.run(run())
+    assert received == ['B AABBCCDDEEFF']
+
+
+def test_polls_until_missing_directory_is_created(tmp_path):
+    # 감시할 디렉터리가 없으면 inotify_add_watch가 실패하므로 polling으로 기다린다.
+    path = tmp_path / 'middleware' / 'middleware.cfg'
+    config = MiddlewareConfig(str(path), poll_interval=0.05)
+    received = []
+    config.add_listener(received.append)
+
+    async def run():
+        config.start_watching()
+        try:
+            assert config._inotify_fd is None
+            path.parent.mkdir()
+            write_config(path, 'A')
+            await wait_for(lambda: received)
+        finally:
+            config.stop_watching()
+
+    asyncio.run(run())
+    assert received == ['A AABBCCDDEEFF']
@@ -0,0 +1,62 @@
+import pytest
+
+from ble_wifi_connector.common.models import BrokerRecord, StatusSnapshot
+
+
+def test_status_snapshot_round_trip():
+    status = StatusSnapshot(state=4, ssid='home', ipv4='192.168.0.10', rssi=-52, last_error=-3, firmware_version='1.2.0')
+    data = status.pack()
+
+    assert data == (
+        bytes([1, 4])  # version, state
+        + (-52).to_bytes(1, 'little', signed=True)
+        + (-3).to_bytes(2, 'little', signed=True)
+        + bytes([192, 168, 0, 10])
+        + bytes([4]) + b'home'
+        + bytes([5]) + b'1.2.0'
+    )
+    assert StatusSnapshot.unpack(data) == status
+
+
+def test_status_snapshot_unknown_values():
+    data = StatusSnapshot().pack()
+
+    # rssi를 모르면 -128, IP가 없으면 0.0.0.0, 문자열은 길이 0으로 보낸다.
+    assert data == bytes([1, 0, 0x80, 0, 0, 0, 0, 0, 0, 0, 0])
+    assert StatusSnapshot.unpack(data) == StatusSnapshot(rssi=None, ipv4='', ssid='', firmware_version='')
+
+
+@pytest.mark.parametrize('rssi, expected', [(-200, None), (-128, None), (-127, -127), (0, 0), (200, 127)])
+def test_status_snapshot_rssi_range(rssi, expected):
+    assert StatusSnapshot.unpack(StatusSnapshot(rssi=rssi).pack()).rssi == expected
+
+
+def test_status_snapshot_non_ascii_ssid():
+    status = StatusSnapshot(ssid='우리집 와이파이', firmware_version='v1')
+    assert StatusSnapshot.unpack(status.pack()) == status
+
+
+def test_status_snapshot_truncates_on_character_boundary():
+    # 'a' 다음의 3바이트 문자들은 255바이트 경계에 걸친다.
+    ssid = 'a' + '가' * 100
+    data = StatusSnapshot(ssid=ssid, firmware_version='x' * 300).pack()
+    unpacked = StatusSnapshot.unpack(data)
+
+    assert unpacked.ssid == 'a' + '가' * 84
+    assert len(unpacked.ssid.encode()) == 253
+    assert unpacked.firmware_version == 'x' * 255
+
+
+def test_status_snapshot_rejects_other_versions():
+    data = bytearray(StatusSnapshot().pack())
+    data[0] = 2
+    with pytest.raises(ValueError):
+        StatusSnapshot.unpack(bytes(data))
+
+
+def test_broker_record_expiry():
+    record = BrokerRecord(name='JOI Hub._mqtt._tcp.local.', host='192.168.0.2', port=1883, expires_at=10)
+
+    assert record.address == '192.168.0.2:1883'
+    assert not record.is_expired(9.9)
+    assert record.is_expired(10)
@@ -0,0 +1,164 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+bleak = pytest.importorskip('bleak')
+
+from ble_wifi_connector import relay_provisioner as relay_provisioner_module
+from ble_wifi_connector.relay_provisioner import RelayProvisioner
+from ble_wifi_connector.common.models import RelayOutcome
+from ble_wifi_connector.common.uuids import DeviceWifiUUID
+
+
+class FakeScanner:
+    """BleakScanner 대신 만들어진 인스턴스를 기록하고, 테스트가 detection_callback을 직접 부른다."""
+
+    instances = []
+
+    def __init__(self, detection_callback, service_uuids) -> None:
+        self.detection_callback = detection_callback
+        self.service_uuids = service_uuids
+        self.running = False
+        FakeScanner.instances.append(self)
+
+    async def start(self):
+        self.running = True
+
+    async def stop(self):
+        self.running = False
+
+    def detect(self, address: str, name: str = None, local_name: str = None):
+        self.detection_callback(SimpleNamespace(address=address, name=name), SimpleNamespace(local_name=local_name))
+
+
+@pytest.fixture
+def scanner(monkeypatch):
+    FakeScanner.instances = []
+    monkeypatch.setattr(bleak, 'BleakScanner', FakeScanner)
+    return FakeScanner
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(relay_provisioner_module, 'time', SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0]))
+    return now
+
+
+def fake_provision(provisioner: RelayProvisioner, results: list) -> list:
+    """_provision 대신 results 순서대로 성공/실패를 돌려주고 시도한 주소를 기록한다."""
+    attempts = []
+
+    async def provision(device, name):
+        attempts.append(device.address.upper())
+        return RelayOutcome(address=device.address.upper(), name=name, success=results.pop(0), message='')
+
+    provisioner._provision = provision
+    return attempts
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_empty_allow_list_does_not_scan(scanner):
+    async def scenario():
+        provisioner = RelayProvisioner(allow_list=[])
+        return await provisioner.start(), provisioner.is_running()
+
+    assert asyncio.run(scenario()) == (False, False)
+    assert scanner.instances == []
+
+
+@pytest.mark.parametrize(
+    'name, address, allowed',
+    [
+        ('JOI Device 01', '11:22:33:44:55:66', True),
+        ('joi device 01', '11:22:33:44:55:66', False),  # 이름은 대소문자를 구분한다.
+        ('Lamp', 'aa:bb:cc:00:00:01', True),  # 주소는 대소문자를 구분하지 않는다.
+        ('Lamp', 'AA:BB:CD:00:00:01', False),
+        (None, 'AA:BB:CC:12:34:56', True),
+        (None, '11:22:33:44:55:66', False),
+    ],
+)
+def test_allow_list_matches_name_or_address(name, address, allowed):
+    provisioner = RelayProvisioner(allow_list=['JOI Device *', 'aa:bb:cc:*'])
+    assert provisioner.is_allowed(name, address) == allowed
+
+
+def test_only_allowed_devices_are_provisioned(scanner, clock):
+    async def scenario():
+        provisioner = RelayProvisioner(allow_list=['JOI Device *'], max_workers=2)
+        attempts = fake_provision(provisioner, [True])
+        assert await provisioner.start()
+        fake = scanner.instances[0]
+
+        fake.detect('11:22:33:44:55:66', local_name='JOI Device 01')
+        fake.detect('11:22:33:44:55:77', name='Other')
+        await settle()
+        # 설정을 마친 디바이스는 다시 발견되어도 건너뛴다.
+        fake.detect('11:22:33:44:55:66', local_name='JOI Device 01')
+        await settle()
+
+        await provisioner.stop()
+        return fake, attempts, [outcome.success for outcome in provisioner.outcomes]
+
+    fake, attempts, outcomes = asyncio.run(scenario())
+    assert fake.service_uuids == [DeviceWifiUUID.SERVICE.lower()]
+    assert not fake.running
+    assert attempts == ['11:22:33:44:55:66']
+    assert outcomes == [True]
+
+
+def test_failed_device_waits_retry_interval(scanner, clock, tmp_path):
+    outcome_log_path = tmp_path / 'relay.log'
+
+    async def scenario():
+        provisioner = RelayProvisioner(allow_list=['JOI Device *'], retry_interval=300, outcome_log_path=str(outcome_log_path))
+        attempts = fake_provision(provisioner, [False, True])
+        await provisioner.start()
+        fake = scanner.instances[0]
+
+        fake.detect('11:22:33:44:55:66', local_name='JOI Device 01')
+        await settle()
+        clock[0] += 299
+        fake.detect('11:22:33:44:55:66', local_name='JOI Device 01')
+        await settle()
+        skipped = list(attempts)
+
+        clock[0] += 1
+        fake.detect('11:22:33:44:55:66', local_name='JOI Device 01')
+        await settle()
+        await provisioner.stop()
+        return skipped, attempts
+
+    skipped, attempts = asyncio.run(scenario())
+    assert skipped == ['11:22:33:44:55:66']
+    assert attempts == ['11:22:33:44:55:66'] * 2
+    assert [json.loads(line)['success'] for line in outcome_log_path.read_text().splitlines()] == [False, True]
+
+
+def test_new_credentials_reset_retry_state(scanner, clock):
+    async def scenario():
+        provisioner = RelayProvisioner(allow_list=['JOI Device *'])
+        provisioner.set_credentials('home', 'secret', '192.168.0.2')
+        attempts = fake_provision(provisioner, [True, False, True, True])
+        await provisioner.start()
+        fake = scanner.instances[0]
+
+        fake.detect('11:22:33:44:55:66', local_name='JOI Device 01')
+        fake.detect('11:22:33:44:55:77', local_name='JOI Device 02')
+        await settle()
+
+        # 네트워크가 바뀌면 설정한 디바이스와 실패한 디바이스 모두 바로 다시 시도한다.
+        provisioner.set_credentials('office', 'secret', '192.168.0.2')
+        fake.detect('11:22:33:44:55:66', local_name='JOI Device 01')
+        fake.detect('11:22:33:44:55:77', local_name='JOI Device 02')
+        await settle()
+        await provisioner.stop()
+        return attempts
+
+    assert sorted(asyncio.run(scenario())) == ['11:22:33:44:55:66'] * 2 + ['11:22:33:44:55:77'] * 2
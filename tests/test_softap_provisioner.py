@@ -0,0 +1,145 @@
+import json
+import socket
+import asyncio
+
+from ble_wifi_connector.chunked_transfer import TransferKind
+from ble_wifi_connector.softap_provisioner import SoftAPProvisioner
+
+
+class FakeNetworkManager:
+    """nmcli 대신 AP 요청만 기록한다."""
+
+    def __init__(self) -> None:
+        self.started = []
+        self.stopped = 0
+
+    async def start_access_point(self, ssid: str, password: str = '') -> str:
+        self.started.append((ssid, password))
+        return '127.0.0.1'
+
+    async def stop_access_point(self) -> bool:
+        self.stopped += 1
+        return True
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request(raw: bytes, status_provider=None):
+    """AP를 띄우고 raw 요청 하나를 보낸 뒤 (응답, 콜백 인자 목록, FakeNetworkManager)를 돌려준다."""
+    network_manager = FakeNetworkManager()
+    received = []
+
+    async def run():
+        port = get_free_port()
+        softap = SoftAPProvisioner(
+            network_manager,
+            on_credentials=lambda *args: received.append(args),
+            ssid='JOI Hub Setup TEST',
+            password='setup-password',
+            port=port,
+            status_provider=status_provider,
+        )
+        assert await softap.start()
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(raw)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+        finally:
+            await softap.stop()
+        return response
+
+    return asyncio.run(run()), received, network_manager
+
+
+def http_request(method: str, path: str, body: bytes = b'') -> bytes:
+    return f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body
+
+
+def parse_response(response: bytes):
+    header, _, body = response.partition(b'\r\n\r\n')
+    return int(header.split(b' ')[1]), json.loads(body)
+
+
+def test_provision_accepts_credentials():
+    body = json.dumps({'ssid': 'home', 'password': 'secret123', 'ca_certificate': 'PEM'}).encode()
+    response, received, network_manager = request(http_request('POST', '/provision', body))
+
+    status, result = parse_response(response)
+    assert status == 202
+    assert result == {'result': 'accepted', 'ssid': 'home'}
+    assert len(received) == 1
+    address, ssid, password, payloads = received[0]
+    assert address == 'softap:127.0.0.1'
+    assert (ssid, password) == ('home', 'secret123')
+    assert payloads == {TransferKind.CA_CERTIFICATE.value: b'PEM'}
+    assert network_manager.started == [('JOI Hub Setup TEST', 'setup-password')]
+    assert network_manager.stopped == 1
+
+
+def test_provision_rejects_bad_json():
+    response, received, _ = request(http_request('POST', '/provision', b'{"ssid": '))
+
+    status, result = parse_response(response)
+    assert status == 400
+    assert 'error' in result
+    assert received == []
+
+
+def test_provision_rejects_missing_password():
+    response, received, _ = request(http_request('POST', '/provision', json.dumps({'ssid': 'home'}).encode()))
+
+    assert parse_response(response)[0] == 400
+    assert received == []
+
+
+def test_status():
+    response, received, _ = request(http_request('GET', '/status'), status_provider=lambda: {'state': 2})
+
+    assert parse_response(response) == (200, {'state': 2})
+    assert received == []
+
+
+def test_wrong_method_and_path():
+    assert parse_response(request(http_request('GET', '/provision'))[0])[0] == 405
+    assert parse_response(request(http_request('GET', '/unknown'))[0])[0] == 404
+
+
+def test_malformed_request_line_closes_connection():
+    response, received, _ = request(b'garbage\r\n\r\n')
+
+    assert response == b''
+    assert received == []
+
+
+def test_refuses_to_open_without_wpa2_password():
+    network_manager = FakeNetworkManager()
+
+    async def run():
+        results = []
+        for password in ('', 'short', 'x' * 64):
+            softap = SoftAPProvisioner(network_manager, on_credentials=lambda *args: None, ssid='JOI Hub Setup TEST', password=password)
+            results.append(await softap.start())
+        return results
+
+    assert asyncio.run(run()) == [False, False, False]
+    assert network_manager.started == []
+
+
+def test_generates_password_when_not_given():
+    network_manager = FakeNetworkManager()
+
+    async def run():
+        softap = SoftAPProvisioner(network_manager, on_credentials=lambda *args: None, ssid='JOI Hub Setup TEST', port=get_free_port())
+        assert await softap.start()
+        await softap.stop()
+        return softap.password
+
+    password = asyncio.run(run())
+    assert len(password) >= 8
+    assert network_manager.started == [('JOI Hub Setup TEST', password)]
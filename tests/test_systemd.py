@@ -0,0 +1,92 @@
+import os
+import socket
+import asyncio
+
+from ble_wifi_connector.common.systemd import SystemdNotifier
+
+
+def receive_all(sock: socket.socket) -> list:
+    messages = []
+    while True:
+        try:
+            messages.append(sock.recv(1024).decode())
+        except BlockingIOError:
+            return messages
+
+
+def test_disabled_without_notify_socket(monkeypatch):
+    monkeypatch.delenv('NOTIFY_SOCKET', raising=False)
+    notifier = SystemdNotifier()
+
+    assert not notifier.enabled
+    assert not notifier.ready()
+
+
+def test_ready_status_and_stopping(monkeypatch, notify_socket):
+    address, sock = notify_socket
+    monkeypatch.setenv('NOTIFY_SOCKET', address)
+    notifier = SystemdNotifier()
+
+    assert notifier.ready()
+    # READY=1은 한 번만 보낸다.
+    assert notifier.ready()
+    assert notifier.status('BLE_ADVERTISE')
+    assert notifier.stopping()
+    notifier.close()
+
+    assert receive_all(sock) == ['READY=1', 'STATUS=BLE_ADVERTISE', 'STOPPING=1']
+
+
+def test_path_socket(monkeypatch, tmp_path):
+    path = str(tmp_path / 'notify')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    sock.setblocking(False)
+    monkeypatch.setenv('NOTIFY_SOCKET', path)
+
+    notifier = SystemdNotifier()
+    assert notifier.ready()
+    notifier.close()
+
+    assert receive_all(sock) == ['READY=1']
+    sock.close()
+
+
+def test_watchdog_interval_is_for_this_process_only(monkeypatch):
+    monkeypatch.setenv('WATCHDOG_USEC', '30000000')
+    monkeypatch.setenv('WATCHDOG_PID', str(os.getpid()))
+    assert SystemdNotifier().watchdog_interval == 30
+
+    monkeypatch.setenv('WATCHDOG_PID', str(os.getpid() + 1))
+    assert SystemdNotifier().watchdog_interval is None
+
+
+def test_watchdog_pings_stop_when_main_loop_stalls(monkeypatch, notify_socket):
+    address, sock = notify_socket
+    monkeypatch.setenv('NOTIFY_SOCKET', address)
+    monkeypatch.setenv('WATCHDOG_USEC', '100000')
+    monkeypatch.delenv('WATCHDOG_PID', raising=False)
+    notifier = SystemdNotifier()
+
+    async def run():
+        watchdog_task = asyncio.ensure_future(notifier.run_watchdog(stall_timeout=0.3))
+        try:
+            # heartbeat가 오는 동안은 0.05초마다 ping을 보낸다.
+            for _ in range(5):
+                notifier.heartbeat()
+                await asyncio.sleep(0.05)
+            alive = receive_all(sock)
+
+            # heartbeat가 멈추면 stall_timeout이 지난 뒤로는 ping을 보내지 않는다.
+            await asyncio.sleep(0.4)
+            receive_all(sock)
+            await asyncio.sleep(0.3)
+            stalled = receive_all(sock)
+        finally:
+            watchdog_task.cancel()
+            notifier.close()
+        return alive, stalled
+
+    alive, stalled = asyncio.run(run())
+    assert alive and set(alive) == {'WATCHDOG=1'}
+    assert stalled == []
@@ -0,0 +1,98 @@
+import os
+import asyncio
+
+import pytest
+
+from ble_wifi_connector import wifi_manager as wifi_manager_module
+from ble_wifi_connector.wifi_manager import Uplink, UplinkPolicy, UplinkType, WiFiManager
+
+
+DEV_STATUS = ('nmcli', '-t', '-f', 'DEVICE,TYPE,STATE', 'dev', 'status')
+ROUTE = ('ip', 'route', 'get', '1.1.1.1')
+
+
+def make_manager(monkeypatch, outputs: dict, drivers: dict = None) -> WiFiManager:
+    """_run_command는 outputs에서, 장치 드라이버는 drivers에서 돌려주는 WiFiManager"""
+    manager = WiFiManager()
+
+    async def run_command(*args):
+        return outputs.get(args, '')
+
+    realpath = os.path.realpath
+
+    def fake_realpath(path, *args, **kwargs):
+        for device, driver in (drivers or {}).items():
+            if path == f'/sys/class/net/{device}/device/driver':
+                return f'/sys/bus/usb/drivers/{driver}'
+        return realpath(path, *args, **kwargs)
+
+    monkeypatch.setattr(manager, '_run_command', run_command)
+    monkeypatch.setattr(wifi_manager_module.os.path, 'realpath', fake_realpath)
+    return manager
+
+
+def test_get_uplinks_classifies_devices(monkeypatch):
+    manager = make_manager(
+        monkeypatch,
+        {
+            DEV_STATUS: (
+                'eth0:ethernet:connected\n'
+                'usb0:ethernet:connected\n'
+                'wlan0:wifi:connected (externally)\n'
+                'wlan1:wifi:disconnected\n'
+                'lo:loopback:connected (externally)\n'
+                'p2p-dev-wlan0:wifi-p2p:disconnected\n'
+            )
+        },
+        drivers={'eth0': 'r8152', 'usb0': 'rndis_host'},
+    )
+
+    assert asyncio.run(manager.get_uplinks()) == [
+        Uplink('eth0', UplinkType.ETHERNET),
+        Uplink('usb0', UplinkType.USB),
+        Uplink('wlan0', UplinkType.WIFI),
+    ]
+
+
+@pytest.mark.parametrize(
+    'policy, route, expected',
+    [
+        # 유선 경로
+        (UplinkPolicy.WIRED, '1.1.1.1 via 192.168.0.1 dev eth0 src 192.168.0.10 uid 0\n    cache\n', Uplink('eth0', UplinkType.ETHERNET)),
+        (UplinkPolicy.ANY, '1.1.1.1 via 192.168.0.1 dev eth0 src 192.168.0.10 uid 0\n', Uplink('eth0', UplinkType.ETHERNET)),
+        (UplinkPolicy.WIFI_ONLY, '1.1.1.1 via 192.168.0.1 dev eth0 src 192.168.0.10 uid 0\n', None),
+        # USB 테더링
+        (UplinkPolicy.WIRED, '1.1.1.1 via 192.168.42.129 dev usb0 src 192.168.42.10 uid 0\n', Uplink('usb0', UplinkType.USB)),
+        # WiFi만 있는 경우는 ANY에서만 업링크로 본다.
+        (UplinkPolicy.WIRED, '1.1.1.1 via 10.0.0.1 dev wlan0 src 10.0.0.5 uid 0\n', None),
+        (UplinkPolicy.ANY, '1.1.1.1 via 10.0.0.1 dev wlan0 src 10.0.0.5 uid 0\n', Uplink('wlan0', UplinkType.WIFI)),
+        # 경로가 없음
+        (UplinkPolicy.ANY, '', None),
+        # NetworkManager가 관리하지 않는 장치로 가는 경로
+        (UplinkPolicy.ANY, '1.1.1.1 dev tun0 src 10.8.0.2 uid 0\n', None),
+    ],
+)
+def test_find_uplink(monkeypatch, policy, route, expected):
+    manager = make_manager(
+        monkeypatch,
+        {
+            DEV_STATUS: 'eth0:ethernet:connected\nusb0:ethernet:connected\nwlan0:wifi:connected\n',
+            ROUTE: route,
+        },
+        drivers={'eth0': 'e1000e', 'usb0': 'cdc_ether'},
+    )
+
+    assert asyncio.run(manager.find_uplink(policy, '1.1.1.1')) == expected
+
+
+def test_find_uplink_ignores_disconnected_route_device(monkeypatch):
+    manager = make_manager(
+        monkeypatch,
+        {
+            DEV_STATUS: 'eth0:ethernet:unavailable\nwlan0:wifi:disconnected\n',
+            ROUTE: '1.1.1.1 via 192.168.0.1 dev eth0 src 192.168.0.10 uid 0\n',
+        },
+        drivers={'eth0': 'e1000e'},
+    )
+
+    assert asyncio.run(manager.find_uplink(UplinkPolicy.ANY, '1.1.1.1')) is None